@@ -36,7 +36,7 @@ def create_cube_stl(size=20, filename="test_cube.stl"):
     # Write binary STL file
     with open(filename, 'wb') as f:
         # Write header (80 bytes)
-        header = b"Binary STL created by Python 3D Slicer" + b"\0" * 41
+        header = b"Binary STL created by Python 3D Slicer".ljust(80, b"\0")
         f.write(header)
         
         # Write number of triangles
@@ -0,0 +1,198 @@
+import gzip
+import os
+import struct
+import zlib
+
+COMPRESSION_LEVEL = 6
+
+# Binary G-code: a file header, zlib compressed blocks of G-code text grouped
+# into sections (header, one per layer, footer), the section index and a
+# trailer pointing at the index, so a reader can seek straight to any layer
+BINARY_GCODE_MAGIC = b'GCDB'
+BINARY_GCODE_VERSION = 1
+BINARY_BLOCK_SIZE = 256 * 1024  # Raw text per compressed block
+
+FILE_HEADER = struct.Struct('<4sHH')      # Magic, version, reserved
+BLOCK_HEADER = struct.Struct('<III')      # Raw size, stored size, CRC32 of the raw text
+INDEX_ENTRY = struct.Struct('<QIQi')      # First block offset, block count, raw size, layer (-1 for none)
+TRAILER = struct.Struct('<QI4s')          # Index offset, section count, magic
+
+# File name extension of the binary format, which is not Prusa's .bgcode
+BINARY_GCODE_EXTENSION = '.gcdb'
+
+class GzipEncoder:
+    """Write gzip compressed G-code to a binary stream as it is generated"""
+    def __init__(self, stream, level=COMPRESSION_LEVEL):
+        self.gzip_file = gzip.GzipFile(fileobj=stream, mode='wb', compresslevel=level)
+        
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        return self.gzip_file.write(data)
+        
+    def close(self):
+        """Finish the gzip stream, the underlying stream is left open"""
+        self.gzip_file.close()
+        
+    def __enter__(self):
+        return self
+        
+    def __exit__(self, *exc_info):
+        self.close()
+
+class BinaryGCodeEncoder:
+    """Write G-code in the binary block format to a binary stream
+    
+    Text is collected and compressed in blocks of BINARY_BLOCK_SIZE, a block
+    never spans two sections. start_layer() begins a new section, which is
+    how GCodeGenerator.generate_to marks the layers. The section index is
+    written by close().
+    """
+    def __init__(self, stream, level=COMPRESSION_LEVEL, block_size=BINARY_BLOCK_SIZE):
+        self.stream = stream
+        self.level = level
+        self.block_size = block_size
+        self.offset = 0
+        self.sections = []  # [first block offset, block count, raw size, layer]
+        self.pending = []
+        self.pending_size = 0
+        
+        self._write(FILE_HEADER.pack(BINARY_GCODE_MAGIC, BINARY_GCODE_VERSION, 0))
+        self._start_section(None)
+        
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.pending.append(data)
+        self.pending_size += len(data)
+        if self.pending_size >= self.block_size:
+            self._flush_block()
+        return len(data)
+        
+    def start_layer(self, layer_index):
+        """Start the section of a layer, or of the header or footer for None"""
+        self._flush_block()
+        self._start_section(layer_index)
+        
+    def close(self):
+        """Write the last block, the index and the trailer; the stream is left open"""
+        self._flush_block()
+        if self.sections and self.sections[-1][1] == 0:
+            self.sections.pop()
+            
+        index_offset = self.offset
+        for section in self.sections:
+            self._write(INDEX_ENTRY.pack(*section))
+        self._write(TRAILER.pack(index_offset, len(self.sections), BINARY_GCODE_MAGIC))
+        
+    def _start_section(self, layer_index):
+        # A section without blocks is replaced instead of left empty
+        if self.sections and self.sections[-1][1] == 0:
+            self.sections.pop()
+        self.sections.append([self.offset, 0, 0, -1 if layer_index is None else layer_index])
+        
+    def _flush_block(self):
+        if not self.pending_size:
+            return
+        raw = b''.join(self.pending)
+        stored = zlib.compress(raw, self.level)
+        self._write(BLOCK_HEADER.pack(len(raw), len(stored), zlib.crc32(raw)))
+        self._write(stored)
+        
+        section = self.sections[-1]
+        section[1] += 1
+        section[2] += len(raw)
+        self.pending = []
+        self.pending_size = 0
+        
+    def _write(self, data):
+        self.stream.write(data)
+        self.offset += len(data)
+        
+    def __enter__(self):
+        return self
+        
+    def __exit__(self, *exc_info):
+        self.close()
+
+class BinaryGCodeReader:
+    """Random access to the sections and layers of a binary G-code stream"""
+    def __init__(self, stream):
+        self.stream = stream
+        
+        stream.seek(0)
+        magic, version, _ = FILE_HEADER.unpack(stream.read(FILE_HEADER.size))
+        if magic != BINARY_GCODE_MAGIC:
+            raise ValueError("Not a binary G-code file")
+        if version != BINARY_GCODE_VERSION:
+            raise ValueError("Unsupported binary G-code version {}".format(version))
+            
+        stream.seek(-TRAILER.size, os.SEEK_END)
+        index_offset, section_count, magic = TRAILER.unpack(stream.read(TRAILER.size))
+        if magic != BINARY_GCODE_MAGIC:
+            raise ValueError("Binary G-code file has no index, it may be truncated")
+            
+        stream.seek(index_offset)
+        index = stream.read(INDEX_ENTRY.size * section_count)
+        self.sections = [INDEX_ENTRY.unpack_from(index, i * INDEX_ENTRY.size) for i in range(section_count)]
+        self.layer_sections = {section[3]: i for i, section in enumerate(self.sections) if section[3] >= 0}
+        
+    @property
+    def layer_count(self):
+        return len(self.layer_sections)
+        
+    def read_section(self, section_index):
+        """Return the text of one section, checking every block"""
+        offset, block_count, raw_size, _ = self.sections[section_index]
+        self.stream.seek(offset)
+        
+        blocks = []
+        for _ in range(block_count):
+            size, stored_size, checksum = BLOCK_HEADER.unpack(self.stream.read(BLOCK_HEADER.size))
+            raw = zlib.decompress(self.stream.read(stored_size))
+            if len(raw) != size or zlib.crc32(raw) != checksum:
+                raise ValueError("Corrupt block in section {}".format(section_index))
+            blocks.append(raw)
+            
+        data = b''.join(blocks)
+        if len(data) != raw_size:
+            raise ValueError("Section {} has {} bytes, expected {}".format(section_index, len(data), raw_size))
+        return data.decode('utf-8')
+        
+    def read_layer(self, layer_index):
+        """Return the G-code text of a layer (0 based)"""
+        return self.read_section(self.layer_sections[layer_index])
+        
+    def iter_sections(self):
+        for i in range(len(self.sections)):
+            yield self.read_section(i)
+            
+    def read_text(self):
+        """Decode the whole file, giving the same text as the plain G-code"""
+        return ''.join(self.iter_sections())
+
+def read_gzip_gcode(stream):
+    """Decode gzip compressed G-code from a binary stream"""
+    with gzip.GzipFile(fileobj=stream, mode='rb') as f:
+        return f.read().decode('utf-8')
+
+# Encoder used for a file name extension, other extensions are written as text
+GCODE_ENCODERS = {
+    '.gz': GzipEncoder,
+    BINARY_GCODE_EXTENSION: BinaryGCodeEncoder
+}
+
+def encoder_for_path(path, stream):
+    """Wrap a binary stream in the encoder matching the file extension, if any"""
+    encoder = GCODE_ENCODERS.get(os.path.splitext(path)[1].lower())
+    return encoder(stream) if encoder else None
+
+def read_gcode(path):
+    """Return the G-code text of a plain, gzip or binary G-code file"""
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, 'rb') as f:
+        if extension == '.gz':
+            return read_gzip_gcode(f)
+        if extension == BINARY_GCODE_EXTENSION:
+            return BinaryGCodeReader(f).read_text()
+        return f.read().decode('utf-8')
@@ -1,28 +1,233 @@
-import math
+import io
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from layer_heights import DEFAULT_MAX_LAYER_HEIGHT, DEFAULT_MIN_LAYER_HEIGHT
+from path_compaction import ARC_TOLERANCE, SIMPLIFY_TOLERANCE, arc_lengths, compact_paths
+from path_optimizer import order_paths, travel_distance
+from print_estimator import (DEFAULT_ACCELERATION, DEFAULT_FILAMENT_DENSITY, DEFAULT_FILAMENT_DIAMETER,
+                             DEFAULT_JERK, filament_mass, format_duration, path_time)
+
+# Text is collected up to this many characters before it is written out
+GCODE_BUFFER_SIZE = 1024 * 1024
+
+# Filament length extruded per mm of travel (simple extrusion calculation)
+PERIMETER_EXTRUSION = 0.05
+INFILL_EXTRUSION = 0.03  # Less extrusion for infill
+SKIN_EXTRUSION = PERIMETER_EXTRUSION  # Solid fill is extruded like the walls
+
+# Every layer is ordered as if the nozzle starts here, which keeps layers
+# independent of each other and puts perimeter seams near a common corner
+TRAVEL_ORIGIN = (0.0, 0.0)
+
+class LayerGCode:
+    """G-code of one layer rendered independently of the layers before it
+    
+    parts holds literal text and move blocks. The extruder values of the move
+    blocks are relative to the start of the layer, the absolute values are
+    only filled in once the extrusion of all previous layers is known.
+    """
+    def __init__(self, parts, z_height, extrusion, end_position, travel=0.0, unoptimized_travel=0.0, time=0.0):
+        self.parts = parts
+        self.z_height = z_height
+        self.extrusion = extrusion        # Filament used by the layer in mm
+        self.end_position = end_position  # X, Y, Z after the last move, None without moves
+        self.travel = travel              # Travel distance in mm
+        self.unoptimized_travel = unoptimized_travel  # Travel in the order the paths came in
+        self.time = time                  # Estimated time of the XY moves in seconds
+
+class MoveBlock:
+    """Travel and extruding moves along a set of polylines"""
+    def __init__(self, points, extruder, starts, counts, label, arcs=None, lengths=None):
+        self.points = points      # (N, 2) points of all polylines
+        self.extruder = extruder  # (N,) extruder position at each point
+        self.lengths = lengths    # (N,) length of the move ending at each point
+        self.starts = starts      # Index of the first point of every polyline
+        self.counts = counts      # Number of points of every polyline
+        self.label = label
+        self.arcs = arcs          # (N, 3) arc center and direction of each move, None for lines only
+
+def _render_layer_task(layer, layer_num, settings):
+    """Render one layer in a pool worker"""
+    return GCodeGenerator()._render_layer(layer, layer_num, settings)
+
+def _format_layer_task(layer_gcode, extruder_offset):
+    """Format one rendered layer in a pool worker"""
+    return GCodeGenerator()._format_layer(layer_gcode, extruder_offset)
 
 class GCodeGenerator:
     def __init__(self):
         self.current_position = [0, 0, 0]  # X, Y, Z
         self.extruder_position = 0
+        self.travel = 0.0
+        self.unoptimized_travel = 0.0
+        self.print_time = 0.0
+        self.layer_times = []
         
-    def generate(self, layers, settings, progress_callback=None):
+    def generate(self, layers, settings, progress_callback=None, workers=None):
         """Generate G-code from sliced layers"""
-        gcode_lines = []
+        return '\n'.join(self.iter_gcode(layers, settings, progress_callback, workers=workers))
+        
+    def generate_to(self, stream, layers, settings, progress_callback=None, layer_count=None,
+                    buffer_size=GCODE_BUFFER_SIZE, workers=None):
+        """Write G-code to a text or binary file-like object while layers are processed
+        
+        Output is written in buffered chunks, so memory does not grow with the
+        file size. The text written is the same as generate() returns. Returns
+        a dict with the number of 'lines', 'bytes' (UTF-8), 'layers', the
+        total filament 'extrusion' and the 'travel' distance in mm, and the
+        travel the paths would have taken without ordering ('unoptimized_travel').
+        The estimated 'print_time' and 'layer_times' are given in seconds and
+        the 'filament_mass' in grams.
+        
+        Streams with a start_layer(layer_index) method, such as the encoders
+        in gcode_encoders, are told where each layer starts; layer_index is
+        None for the header and the footer.
+        """
+        # Wrappers such as NamedTemporaryFile are not TextIOBase instances,
+        # but text streams are the ones with an encoding
+        binary = not (isinstance(stream, io.TextIOBase) or hasattr(stream, 'encoding'))
+        sections = hasattr(stream, 'start_layer')
+        counters = {'lines': 0, 'bytes': 0, 'layers': 0, 'extrusion': 0.0}
+        buffer = []
+        buffered = 0
+        
+        def flush():
+            if not buffer:
+                return
+            text = ''.join(buffer)
+            data = text.encode('utf-8')
+            stream.write(data if binary else text)
+            counters['bytes'] += len(data)
+            buffer.clear()
+            
+        for i, (layer_index, chunk) in enumerate(self._iter_chunks(layers, settings, progress_callback,
+                                                                    layer_count, workers)):
+            if sections:
+                flush()
+                buffered = 0
+                stream.start_layer(layer_index)
+                
+            if i > 0:
+                buffer.append('\n')
+            buffer.append(chunk)
+            buffered += len(chunk) + 1
+            counters['lines'] += chunk.count('\n') + 1
+            
+            if buffered >= buffer_size:
+                flush()
+                buffered = 0
+                
+        flush()
+        
+        # Header and footer are the only chunks that are not layers
+        counters['layers'] = max(i - 1, 0)
+        counters['extrusion'] = self.extruder_position
+        counters['travel'] = self.travel
+        counters['unoptimized_travel'] = self.unoptimized_travel
+        counters['print_time'] = self.print_time
+        counters['layer_times'] = self.layer_times
+        counters['filament_mass'] = self.filament_mass(settings)
+        return counters
+        
+    def iter_gcode(self, layers, settings, progress_callback=None, layer_count=None, workers=None):
+        """Yield the G-code as text chunks, one for the header, each layer and the footer
+        
+        Layers may come from a generator such as SlicerEngine.iter_layers, every
+        layer is released once its chunk has been produced. Joining the chunks
+        with newlines gives the same text as generate(). layer_count is only
+        used for progress reporting when layers has no length.
+        
+        Every layer is rendered on its own with extrusion relative to its
+        start. A running prefix sum of the layer extrusion totals then gives
+        the absolute extruder values (M82) when the layers are formatted in
+        order. With workers > 1 rendering and formatting run in a process pool.
+        """
+        for _, chunk in self._iter_chunks(layers, settings, progress_callback, layer_count, workers):
+            yield chunk
+            
+    def _iter_chunks(self, layers, settings, progress_callback=None, layer_count=None, workers=None):
+        """Yield (layer_index, text) for every chunk, layer_index is None for header and footer"""
+        if layer_count is None and hasattr(layers, '__len__'):
+            layer_count = len(layers)
+            
+        self.current_position = [0, 0, 0]
+        self.extruder_position = 0
+        self.travel = 0.0
+        self.unoptimized_travel = 0.0
+        self.print_time = 0.0
+        self.layer_times = []
         
         # Add header
-        gcode_lines.extend(self._generate_header(settings))
+        yield None, '\n'.join(self._generate_header(settings))
         
         # Process each layer
-        for i, layer in enumerate(layers):
-            if progress_callback:
-                progress_callback((i / len(layers)) * 100)
+        if workers and workers > 1:
+            texts = self._iter_layer_texts_parallel(layers, settings, workers)
+        else:
+            texts = self._iter_layer_texts(layers, settings)
+            
+        for i, text in enumerate(texts):
+            if progress_callback and layer_count:
+                progress_callback((i / layer_count) * 100)
                 
-            gcode_lines.extend(self._generate_layer(layer, i, settings))
+            yield i, text
             
         # Add footer
-        gcode_lines.extend(self._generate_footer())
+        yield None, '\n'.join(self._generate_footer(settings))
         
-        return '\n'.join(gcode_lines)
+    def _iter_layer_texts(self, layers, settings):
+        """Render and format the layers one after another"""
+        for i, layer in enumerate(layers):
+            layer_gcode = self._render_layer(layer, i, settings)
+            yield self._stitch_layer(layer_gcode, self._format_layer(layer_gcode, self.extruder_position))
+            
+    def _iter_layer_texts_parallel(self, layers, settings, workers):
+        """Render and format layers in a process pool, yielding them in order
+        
+        Rendered layers come back in submission order, so the extrusion offset
+        of every layer is known as soon as it arrives and its formatting can be
+        submitted right away. A bounded number of layers is kept in flight.
+        """
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rendering = deque()
+            formatting = deque()
+            offset = self.extruder_position
+            
+            def format_next():
+                nonlocal offset
+                layer_gcode = rendering.popleft().result()
+                formatting.append((layer_gcode, pool.submit(_format_layer_task, layer_gcode, offset)))
+                offset += layer_gcode.extrusion
+                
+            def finish_next():
+                layer_gcode, future = formatting.popleft()
+                return self._stitch_layer(layer_gcode, future.result())
+                
+            for i, layer in enumerate(layers):
+                rendering.append(pool.submit(_render_layer_task, layer, i, settings))
+                if len(rendering) >= 2 * workers:
+                    format_next()
+                if len(formatting) >= 2 * workers:
+                    yield finish_next()
+                    
+            while rendering:
+                format_next()
+            while formatting:
+                yield finish_next()
+                
+    def _stitch_layer(self, layer_gcode, text):
+        """Advance the generator state past a formatted layer and return its text"""
+        self.extruder_position += layer_gcode.extrusion
+        self.travel += layer_gcode.travel
+        self.unoptimized_travel += layer_gcode.unoptimized_travel
+        self.print_time += layer_gcode.time
+        self.layer_times.append(layer_gcode.time)
+        if layer_gcode.end_position is not None:
+            self.current_position = list(layer_gcode.end_position)
+        else:
+            self.current_position[2] = layer_gcode.z_height
+        return text
         
     def _generate_header(self, settings):
         """Generate G-code header with initialization commands"""
@@ -31,7 +236,13 @@ class GCodeGenerator:
             "; Nozzle temperature: {}°C".format(settings['nozzle_temp']),
             "; Bed temperature: {}°C".format(settings['bed_temp']),
             "; Layer height: {}mm".format(settings['layer_height']),
-            "; Print speed: {}mm/s".format(settings['print_speed']),
+            "; Print speed: {}mm/s".format(settings['print_speed'])
+        ]
+        if settings.get('adaptive_layers'):
+            lines.append("; Adaptive layer height: {}-{}mm".format(
+                settings.get('min_layer_height', DEFAULT_MIN_LAYER_HEIGHT),
+                settings.get('max_layer_height', DEFAULT_MAX_LAYER_HEIGHT)))
+        lines += [
             "",
             "G21 ; Set units to millimeters",
             "G90 ; Use absolute coordinates",
@@ -51,93 +262,181 @@ class GCodeGenerator:
         ]
         return lines
         
-    def _generate_layer(self, layer, layer_num, settings):
-        """Generate G-code for a single layer"""
-        lines = [
+    def _render_layer(self, layer, layer_num, settings):
+        """Render the moves of a single layer with extrusion relative to its start"""
+        parts = ['\n'.join([
             "",
             "; Layer {}".format(layer_num + 1),
             "G1 Z{:.3f} ; Move to layer height".format(layer.z_height)
-        ]
-        
-        # Update current Z position
-        self.current_position[2] = layer.z_height
+        ])]
+        extrusion = 0.0
+        end_position = None
         
-        # Print perimeters first
-        for polygon in layer.perimeters:
-            lines.extend(self._print_polygon(polygon, settings))
+        # Print the wall shells first, layers without shells print their contours
+        rings = []
+        for polygon in layer.perimeters if layer.shells is None else layer.shells:
+            rings.extend(self._polygon_rings(polygon))
             
-        # Print infill
-        for infill_line in layer.infill_lines:
-            lines.extend(self._print_line(infill_line, settings))
-            
-        return lines
+        # Print infill, then the solid skin near top and bottom surfaces
+        infill_lines = [line for line in layer.infill_lines if len(line) >= 2]
+        skin_lines = [line for line in layer.skin_lines if len(line) >= 2]
         
-    def _print_polygon(self, polygon, settings):
-        """Generate G-code to print a polygon perimeter"""
-        lines = []
+        # Order the paths to shorten travel, each kind continues where the one before ends
+        unoptimized_travel = travel_distance(rings + infill_lines + skin_lines, TRAVEL_ORIGIN)
+        if settings.get('optimize_travel', True):
+            rings = order_paths(rings, TRAVEL_ORIGIN, closed=True)
+            infill_start = rings[-1][-1] if rings else TRAVEL_ORIGIN
+            infill_lines = order_paths(infill_lines, infill_start)
+            skin_start = infill_lines[-1][-1] if infill_lines else infill_start
+            skin_lines = order_paths(skin_lines, skin_start)
+        travel = travel_distance(rings + infill_lines + skin_lines, TRAVEL_ORIGIN)
         
-        try:
-            coords = list(polygon.exterior.coords)
+        # Merge and simplify points and fit arcs, which leaves far fewer moves on curves
+        tolerance = settings.get('simplify_tolerance', SIMPLIFY_TOLERANCE)
+        arc_tolerance = settings.get('arc_tolerance', ARC_TOLERANCE) if settings.get('arc_fitting', True) else 0
+        ring_arcs = infill_arcs = skin_arcs = None
+        if tolerance or arc_tolerance:
+            rings, ring_arcs = compact_paths(rings, tolerance, arc_tolerance)
+            infill_lines, infill_arcs = compact_paths(infill_lines, tolerance, arc_tolerance)
+            skin_lines, skin_arcs = compact_paths(skin_lines, tolerance, arc_tolerance)
             
-            if len(coords) < 3:
-                return lines
+        # The extrusion rates are for the thickest layers, layer_height or the
+        # max_layer_height of adaptive layers, which do not use layer_height.
+        # Thinner layers scale them down
+        if settings.get('adaptive_layers'):
+            reference_height = settings.get('max_layer_height', DEFAULT_MAX_LAYER_HEIGHT)
+        else:
+            reference_height = settings['layer_height']
+        scale = layer.thickness / reference_height if layer.thickness else 1.0
+        
+        for paths, arcs, extrusion_per_mm, label in [(rings, ring_arcs, PERIMETER_EXTRUSION, "perimeter"),
+                                                     (infill_lines, infill_arcs, INFILL_EXTRUSION, "infill"),
+                                                     (skin_lines, skin_arcs, SKIN_EXTRUSION, "skin")]:
+            block = self._print_paths(paths, extrusion_per_mm * scale, label, extrusion, arcs)
+            if block is not None:
+                parts.append(block)
+                extrusion = float(block.extruder[-1])
+                end_position = (float(block.points[-1, 0]), float(block.points[-1, 1]), layer.z_height)
                 
-            # Move to start position without extruding
-            start_x, start_y = coords[0]
-            lines.append("G1 X{:.3f} Y{:.3f} ; Move to perimeter start".format(start_x, start_y))
+        time = self._estimate_time([part for part in parts if isinstance(part, MoveBlock)], settings)
+        return LayerGCode(parts, layer.z_height, extrusion, end_position, travel, unoptimized_travel, time)
+        
+    def _estimate_time(self, blocks, settings):
+        """Estimate the time of the XY moves of a layer, printed as one chain of moves"""
+        if not blocks:
+            return 0.0
             
-            # Print perimeter
-            for i in range(1, len(coords)):
-                x, y = coords[i]
-                distance = self._calculate_distance(self.current_position[0], self.current_position[1], x, y)
-                extrude_amount = distance * 0.05  # Simple extrusion calculation
-                
-                self.extruder_position += extrude_amount
-                self.current_position[0] = x
-                self.current_position[1] = y
-                
-                lines.append("G1 X{:.3f} Y{:.3f} E{:.5f}".format(x, y, self.extruder_position))
-                
+        points = np.concatenate([block.points for block in blocks])
+        lengths = np.concatenate([block.lengths for block in blocks])
+        
+        # Travel from the end of one block to the start of the next
+        boundaries = np.cumsum([len(block.points) for block in blocks])[:-1]
+        deltas = points[boundaries] - points[boundaries - 1]
+        lengths[boundaries] = np.hypot(deltas[:, 0], deltas[:, 1])
+        
+        return path_time(points, lengths, settings['print_speed'],
+                         settings.get('acceleration', DEFAULT_ACCELERATION), settings.get('jerk', DEFAULT_JERK))
+                         
+    def filament_mass(self, settings):
+        """Mass in grams of the filament extruded so far"""
+        return filament_mass(self.extruder_position,
+                             settings.get('filament_diameter', DEFAULT_FILAMENT_DIAMETER),
+                             settings.get('filament_density', DEFAULT_FILAMENT_DENSITY))
+                             
+    def _format_layer(self, layer_gcode, extruder_offset):
+        """Format a rendered layer with its extruder values shifted by the offset"""
+        texts = []
+        for part in layer_gcode.parts:
+            if isinstance(part, MoveBlock):
+                texts.append(self._format_moves(part, extruder_offset))
+            else:
+                texts.append(part)
+        return '\n'.join(texts)
+        
+    def _polygon_rings(self, polygon):
+        """Return the outline and hole outlines of a polygon as coordinate arrays"""
+        try:
+            rings = [np.asarray(ring.coords) for ring in [polygon.exterior] + list(polygon.interiors)]
         except Exception:
             # Fallback for invalid polygons
-            pass
-            
-        return lines
+            return []
+        return [ring for ring in rings if len(ring) >= 3]
         
-    def _print_line(self, line_coords, settings):
-        """Generate G-code to print an infill line"""
-        lines = []
+    def _print_paths(self, paths, extrusion_per_mm, label, extruder_start=0.0, arcs=None):
+        """Build the moves to the start of every polyline and along it
         
-        if len(line_coords) < 2:
-            return lines
+        The points of all polylines are handled as one array, segment lengths
+        and extruder positions are computed with NumPy at once. Every polyline
+        is entered with a travel move, so the moves do not depend on where the
+        nozzle was before. arcs optionally gives the arc of every move as
+        returned by compact_paths. Returns a MoveBlock, or None without paths.
+        """
+        if not paths:
+            return None
             
-        # Move to start position
-        start_x, start_y = line_coords[0][:2]
-        lines.append("G1 X{:.3f} Y{:.3f} ; Move to infill start".format(start_x, start_y))
-        
-        # Print line segments
-        for i in range(1, len(line_coords)):
-            x, y = line_coords[i][:2]
-            distance = self._calculate_distance(self.current_position[0], self.current_position[1], x, y)
-            extrude_amount = distance * 0.03  # Less extrusion for infill
+        counts = np.array([len(path) for path in paths])
+        points = np.concatenate([np.asarray(path, dtype=np.float64)[:, :2] for path in paths])
+        starts = np.cumsum(counts) - counts
+        
+        previous = np.concatenate([points[:1], points[:-1]])
+        if arcs is not None:
+            arcs = np.concatenate(arcs)
+            arcs[starts] = 0.0
+            if not arcs[:, 2].any():
+                arcs = None
+                
+        if arcs is None:
+            deltas = points - previous
+            lengths = np.sqrt(deltas[:, 0] * deltas[:, 0] + deltas[:, 1] * deltas[:, 1])
+        else:
+            lengths = arc_lengths(previous, points, arcs)
             
-            self.extruder_position += extrude_amount
-            self.current_position[0] = x
-            self.current_position[1] = y
+        # Travel moves to the polyline starts do not extrude
+        amounts = lengths * extrusion_per_mm
+        amounts[starts] = 0.0
+        extruder = extruder_start + np.cumsum(amounts)
+        
+        return MoveBlock(points, extruder, starts, counts, label, arcs, lengths)
+        
+    def _format_moves(self, block, extruder_offset):
+        """Render the travel, extruding G1 and arc G2/G3 moves of a block with one formatting call"""
+        travel = "G1 X%.3f Y%.3f ; Move to {} start\n".format(block.label)
+        move = "G1 X%.3f Y%.3f E%.5f\n"
+        
+        if block.arcs is None:
+            template = ''.join([travel + move * (count - 1) for count in block.counts.tolist()])
             
-            lines.append("G1 X{:.3f} Y{:.3f} E{:.5f}".format(x, y, self.extruder_position))
+            # Travel moves take no extruder value
+            values = np.column_stack([block.points, block.extruder + extruder_offset]).ravel()
+            keep = np.ones(len(values), dtype=bool)
+            keep[block.starts * 3 + 2] = False
+            return template[:-1] % tuple(values[keep].tolist())
             
-        return lines
+        # Move kinds: 0 travel, 1 line, 2 clockwise arc, 3 counterclockwise arc
+        templates = [travel, move, "G2 X%.3f Y%.3f I%.3f J%.3f E%.5f\n", "G3 X%.3f Y%.3f I%.3f J%.3f E%.5f\n"]
+        direction = block.arcs[:, 2]
+        kinds = np.where(direction == 0, 1, np.where(direction < 0, 2, 3))
+        kinds[block.starts] = 0
+        template = ''.join([templates[kind] for kind in kinds.tolist()])
         
-    def _calculate_distance(self, x1, y1, x2, y2):
-        """Calculate distance between two points"""
-        return math.sqrt((x2 - x1)**2 + (y2 - y1)**2)
+        # Arc centers are given relative to the start of the arc
+        previous = np.concatenate([block.points[:1], block.points[:-1]])
+        offsets = block.arcs[:, :2] - previous
+        values = np.column_stack([block.points, offsets, block.extruder + extruder_offset])
+        columns = np.array([[True, True, False, False, False],
+                            [True, True, False, False, True],
+                            [True, True, True, True, True],
+                            [True, True, True, True, True]])
+        return template[:-1] % tuple(values[columns[kinds]].tolist())
         
-    def _generate_footer(self):
-        """Generate G-code footer with end commands"""
+    def _generate_footer(self, settings):
+        """Generate G-code footer with end commands and the print estimates"""
         lines = [
             "",
             "; End of print",
+            "; Estimated print time: {}".format(format_duration(self.print_time)),
+            "; Filament used: {:.2f} m, {:.1f} g".format(self.extruder_position / 1000.0,
+                                                        self.filament_mass(settings)),
             "M104 S0 ; Turn off nozzle heater",
             "M140 S0 ; Turn off bed heater",
             "M84 ; Disable motors",
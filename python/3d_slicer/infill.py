@@ -0,0 +1,289 @@
+import math
+import numpy as np
+import shapely
+from collections import OrderedDict
+
+def line_spacing(density, extrusion_width):
+    """Distance between parallel infill lines giving the requested density
+    
+    A density of 1.0 places lines one extrusion width apart (solid fill).
+    Returns None when no infill should be generated.
+    """
+    if density <= 0:
+        return None
+    return extrusion_width / min(density, 1.0)
+
+def polygon_edges(polygons):
+    """Return all ring edges of the polygons as an (E, 2, 2) array"""
+    edges = []
+    for polygon in polygons:
+        for ring in [polygon.exterior] + list(polygon.interiors):
+            points = np.asarray(ring.coords)[:, :2]
+            if len(points) >= 2:
+                edges.append(np.stack([points[:-1], points[1:]], axis=1))
+                
+    if not edges:
+        return np.empty((0, 2, 2))
+    return np.concatenate(edges)
+
+def scanline_infill(polygons, spacing, angle=0.0):
+    """Fill polygons (with holes) with parallel lines at the given spacing and angle
+    
+    All scanlines are intersected with all polygon edges of the layer in one
+    vectorized pass. Crossings are sorted along each scanline and paired
+    even-odd, so holes and separate islands need no special handling. Lines
+    sit on a global grid, so they line up between layers, and alternate in
+    direction to shorten travel. Returns a list of [(x, y), (x, y)] lines.
+    """
+    edges = polygon_edges(polygons)
+    if len(edges) == 0 or not spacing:
+        return []
+        
+    # Rotate the geometry so the scanlines become horizontal
+    cos_a, sin_a = math.cos(angle), math.sin(angle)
+    rotation = np.array([[cos_a, sin_a], [-sin_a, cos_a]])
+    edges = edges @ rotation.T
+    
+    y0, y1 = edges[:, 0, 1], edges[:, 1, 1]
+    low, high = np.minimum(y0, y1), np.maximum(y0, y1)
+    first_line = math.ceil(low.min() / spacing)
+    scan_y = np.arange(first_line, math.floor(high.max() / spacing) + 1) * spacing
+    if len(scan_y) == 0:
+        return []
+        
+    # Every (edge, scanline) crossing with the half-open rule low <= y < high,
+    # which counts a vertex on a scanline exactly once and skips horizontal edges
+    first = np.searchsorted(scan_y, low, side='left')
+    last = np.searchsorted(scan_y, high, side='left')
+    counts = np.maximum(last - first, 0)
+    edge_ids = np.repeat(np.arange(len(edges)), counts)
+    offsets = np.cumsum(counts) - counts
+    line_ids = first[edge_ids] + np.arange(len(edge_ids)) - offsets[edge_ids]
+    
+    y = scan_y[line_ids]
+    start, end = edges[edge_ids, 0], edges[edge_ids, 1]
+    x = start[:, 0] + (y - start[:, 1]) * (end[:, 0] - start[:, 0]) / (end[:, 1] - start[:, 1])
+    
+    # Sort the crossings along every scanline and pair them up inside/outside
+    order = np.lexsort((x, line_ids))
+    x, line_ids = x[order], line_ids[order]
+    
+    # Odd counts only come from broken (unclosed) rings, skip those scanlines
+    even = np.bincount(line_ids, minlength=len(scan_y)) % 2 == 0
+    keep = even[line_ids]
+    x, line_ids = x[keep], line_ids[keep]
+    x_in, x_out = x[0::2], x[1::2]
+    line_ids = line_ids[0::2]
+    y = scan_y[line_ids]
+    
+    # Alternate the direction on every other global scanline
+    reverse = (line_ids + first_line) % 2 == 1
+    x_in, x_out = np.where(reverse, x_out, x_in), np.where(reverse, x_in, x_out)
+    
+    lines = np.stack([np.stack([x_in, y], axis=1), np.stack([x_out, y], axis=1)], axis=1)
+    lines = lines[x_in != x_out]
+    return (lines @ rotation).tolist()
+
+class InfillPattern:
+    """Base class of the infill patterns
+    
+    Straight line patterns list the line directions used on a layer through
+    angles(), each direction is filled by the scanline engine at
+    spacing * len(angles) so the overall density is kept. Curved patterns
+    override tile() instead, which returns the pattern as polylines over a
+    bounding box; tiles are cached and clipped against a layer in one call.
+    """
+    name = None
+    
+    def angles(self, layer_index):
+        return []
+        
+    def tile(self, spacing, bounds, z):
+        return None
+        
+    def tile_key(self, spacing, bounds, z):
+        """Cache key of the tile, layers with equal keys share their tile"""
+        return (self.name, spacing, bounds)
+
+class LinesPattern(InfillPattern):
+    """Horizontal lines on every layer"""
+    name = 'lines'
+    
+    def angles(self, layer_index):
+        return [0.0]
+
+class RectilinearPattern(InfillPattern):
+    """Diagonal lines turning by 90 degrees on every layer"""
+    name = 'rectilinear'
+    
+    def angles(self, layer_index):
+        return [math.pi / 4 if layer_index % 2 == 0 else -math.pi / 4]
+
+class GridPattern(InfillPattern):
+    """Two crossing diagonal line sets on every layer"""
+    name = 'grid'
+    
+    def angles(self, layer_index):
+        return [math.pi / 4, -math.pi / 4]
+
+class TrianglesPattern(InfillPattern):
+    """Three line sets 60 degrees apart forming triangles"""
+    name = 'triangles'
+    
+    def angles(self, layer_index):
+        return [0.0, math.pi / 3, 2 * math.pi / 3]
+
+class HoneycombPattern(InfillPattern):
+    """Mirrored zigzag rows whose shared flats form hexagons
+    
+    Neighbouring rows meet on their flats, the flats are the hexagon walls
+    running along X. Every flat is printed once: the rows rising from their
+    base are whole zigzags, the mirrored rows between them only add their
+    slanted walls as separate segments.
+    """
+    name = 'honeycomb'
+    
+    def tile(self, spacing, bounds, z):
+        min_x, min_y, max_x, max_y = bounds
+        
+        # Hexagon side giving the same printed length per area as straight
+        # lines at this spacing, 6 sides per 3 * sqrt(3) * side^2 of area
+        side = 2 * spacing / math.sqrt(3)
+        rise = side * math.sqrt(3) / 2
+        period = 3 * side
+        
+        # One zigzag period: flat, rise, flat, fall, anchored at the origin so
+        # every tile of the pattern lines up
+        first = math.floor(min_x / period)
+        count = math.ceil(max_x / period) - first + 1
+        starts = (first + np.arange(count)) * period
+        xs = (starts[:, None] + np.array([0, side, 1.5 * side, 2.5 * side])).ravel()
+        profile = np.tile([0, 0, rise, rise], count)
+        
+        # Slanted walls of a mirrored row, falling from its upper flat onto the
+        # shared flat in the middle and rising again
+        slant_x = (starts[:, None, None] + np.array([[side, 1.5 * side], [2.5 * side, 3 * side]])).reshape(-1, 2)
+        slant_y = np.tile([[2 * rise, rise], [rise, 2 * rise]], (count, 1))
+        
+        rows = []
+        for row in range(math.floor(min_y / (2 * rise)), math.ceil(max_y / (2 * rise)) + 1):
+            base = row * 2 * rise
+            rows.append(np.stack([xs, base + profile], axis=1))
+            rows.extend(np.stack([slant_x, base + slant_y], axis=2))
+        return rows
+
+class GyroidPattern(InfillPattern):
+    """Cross sections of a gyroid surface, changing smoothly with Z
+    
+    The curves solve sin(x)cos(y) + sin(y)cos(z) + sin(z)cos(x) = 0 for y as a
+    function of x while |cos z| >= |sin z| and for x as a function of y
+    otherwise, which keeps the solution real. Tiles repeat with the period of
+    the surface, so Z is quantized to a fixed number of phases per period.
+    """
+    name = 'gyroid'
+    phases = 64
+    samples_per_period = 24
+    
+    def _phase(self, spacing, z):
+        scale = math.pi / spacing
+        step = 2 * math.pi / self.phases
+        return (round(z * scale / step) % self.phases) * step
+        
+    def tile_key(self, spacing, bounds, z):
+        return (self.name, spacing, bounds, self._phase(spacing, z))
+        
+    def tile(self, spacing, bounds, z):
+        # Two curves per period, so a period spans two line spacings
+        scale = math.pi / spacing
+        phase = self._phase(spacing, z)
+        min_x, min_y, max_x, max_y = [value * scale for value in bounds]
+        
+        solve_y = abs(math.cos(phase)) >= abs(math.sin(phase))
+        if solve_y:
+            along_min, along_max, across_min, across_max = min_x, max_x, min_y, max_y
+        else:
+            along_min, along_max, across_min, across_max = min_y, max_y, min_x, max_x
+            
+        samples = int(math.ceil((along_max - along_min) / (2 * math.pi) * self.samples_per_period)) + 1
+        t = np.linspace(along_min, along_max, max(samples, 2))
+        
+        # a cos(s) + b sin(s) = -c along the swept axis t, solved for s
+        if solve_y:
+            a, b, c = np.sin(t), math.cos(phase), math.sin(phase) * np.cos(t)
+        else:
+            a, b, c = math.sin(phase), np.cos(t), np.sin(t) * math.cos(phase)
+        radius = np.hypot(a, b)
+        offset = np.arctan2(b, a)
+        spread = np.arccos(np.clip(-c / np.maximum(radius, 1e-12), -1.0, 1.0))
+        
+        curves = []
+        for k in range(math.floor(across_min / (2 * math.pi)) - 1, math.ceil(across_max / (2 * math.pi)) + 2):
+            for branch in (offset + spread, offset - spread):
+                s = branch + 2 * math.pi * k
+                if s.max() < across_min or s.min() > across_max:
+                    continue
+                points = np.stack([t, s], axis=1) if solve_y else np.stack([s, t], axis=1)
+                curves.append(points / scale)
+        return curves
+
+INFILL_PATTERNS = {
+    pattern.name: pattern for pattern in [
+        LinesPattern(), RectilinearPattern(), GridPattern(), TrianglesPattern(),
+        HoneycombPattern(), GyroidPattern()
+    ]
+}
+
+# Tiles are snapped outward to this many line spacings so similar layers share them
+TILE_GRID = 16
+TILE_CACHE_SIZE = 256
+
+_tile_cache = OrderedDict()
+
+def generate_infill(polygons, pattern_name, spacing, layer_index, z):
+    """Fill the polygons of one layer with the named pattern"""
+    if not polygons or not spacing:
+        return []
+        
+    pattern = INFILL_PATTERNS[pattern_name]
+    angles = pattern.angles(layer_index)
+    if angles:
+        lines = []
+        for angle in angles:
+            lines.extend(scanline_infill(polygons, spacing * len(angles), angle))
+        return lines
+        
+    # Snap the layer bounds outward so the tile is reused by similar layers
+    grid = TILE_GRID * spacing
+    min_x, min_y, max_x, max_y = shapely.total_bounds(polygons)
+    bounds = (math.floor(min_x / grid) * grid, math.floor(min_y / grid) * grid,
+              math.ceil(max_x / grid) * grid, math.ceil(max_y / grid) * grid)
+              
+    tile = _cached_tile(pattern, spacing, bounds, z)
+    if tile is None:
+        return []
+        
+    # Clip every tile line against the layer region in one vectorized call,
+    # lines are clipped independently so rows sharing flats stay continuous
+    region = shapely.union_all(polygons)
+    shapely.prepare(region)
+    clipped = shapely.get_parts(shapely.intersection(tile, region))
+    return [list(line.coords) for line in clipped
+            if line.geom_type == 'LineString' and len(line.coords) >= 2]
+
+def _cached_tile(pattern, spacing, bounds, z):
+    """Return the pattern tile as an array of LineStrings from a small LRU cache"""
+    key = pattern.tile_key(spacing, bounds, z)
+    if key in _tile_cache:
+        _tile_cache.move_to_end(key)
+        return _tile_cache[key]
+        
+    lines = pattern.tile(spacing, bounds, z)
+    tile = None
+    if lines:
+        indices = np.repeat(np.arange(len(lines)), [len(line) for line in lines])
+        tile = shapely.linestrings(np.concatenate(lines), indices=indices)
+        
+    _tile_cache[key] = tile
+    if len(_tile_cache) > TILE_CACHE_SIZE:
+        _tile_cache.popitem(last=False)
+    return tile
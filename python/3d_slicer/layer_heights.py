@@ -0,0 +1,85 @@
+import math
+import numpy as np
+
+# Limits of the adaptive layer height in mm
+DEFAULT_MIN_LAYER_HEIGHT = 0.1
+DEFAULT_MAX_LAYER_HEIGHT = 0.3
+
+# Z bins per minimum layer height used to look up the surface slope
+ADAPTIVE_BINS_PER_LAYER = 4
+
+# Heights between the minimum and the maximum that layers are rounded down to
+ADAPTIVE_HEIGHT_STEPS = 32
+
+# Fraction of the minimum height left at the top that gets no layer of its
+# own, stacking heights drifts by rounding errors
+ADAPTIVE_END_TOLERANCE = 1e-6
+
+def uniform_layer_heights(z_min, z_max, layer_height):
+    """Start heights and thicknesses of equal layers covering z_min to z_max"""
+    layer_count = int(math.ceil((z_max - z_min) / layer_height))
+    return z_min + np.arange(layer_count) * layer_height, np.full(layer_count, float(layer_height))
+
+def face_layer_heights(face_normals, min_height, max_height):
+    """Thickest layer allowed through every face
+    
+    A layer of height h leaves a stair step of h * |n_z| across a face with
+    unit normal n. Keeping it below min_height gives h = min_height / |n_z|,
+    so vertical walls get max_height and flat surfaces min_height.
+    """
+    nz = np.abs(np.asarray(face_normals, dtype=np.float64)[:, 2])
+    with np.errstate(divide='ignore'):
+        return np.clip(min_height / nz, min_height, max_height)
+
+def adaptive_layer_heights(face_normals, face_z_extent, min_height, max_height):
+    """Start heights and thicknesses of layers that follow the surface slope
+    
+    The Z range is split into bins of a fraction of min_height and every bin
+    gets the smallest allowed height of the faces crossing it. The faces are
+    grouped by their height rounded down to ADAPTIVE_HEIGHT_STEPS values and
+    counted per bin with difference arrays, so this is a few passes over the
+    faces. Layers are then stacked bottom up, each as thick as every bin it
+    covers allows.
+    """
+    z_extent = np.asarray(face_z_extent, dtype=np.float64)
+    if len(z_extent) == 0:
+        return np.zeros(0), np.zeros(0)
+        
+    z_min = float(z_extent[:, 0].min())
+    z_max = float(z_extent[:, 1].max())
+    bin_size = min_height / ADAPTIVE_BINS_PER_LAYER
+    bin_count = max(int(math.ceil((z_max - z_min) / bin_size)), 1)
+    
+    steps = np.linspace(min_height, max_height, ADAPTIVE_HEIGHT_STEPS)
+    levels = np.searchsorted(steps, face_layer_heights(face_normals, min_height, max_height), side='right') - 1
+    levels = np.maximum(levels, 0)
+    
+    # Faces of every level crossing every bin, from +1 / -1 at the ends of their range
+    first = np.clip(((z_extent[:, 0] - z_min) / bin_size).astype(np.int64), 0, bin_count - 1)
+    last = np.clip(((z_extent[:, 1] - z_min) / bin_size).astype(np.int64), 0, bin_count - 1)
+    width = bin_count + 1
+    size = len(steps) * width
+    changes = (np.bincount(levels * width + first, minlength=size) -
+               np.bincount(levels * width + last + 1, minlength=size))
+    crossing = np.cumsum(changes.reshape(len(steps), width), axis=1)[:, :bin_count] > 0
+    
+    # Smallest level crossing each bin, bins without faces allow the maximum
+    bin_heights = np.where(crossing.any(axis=0), steps[np.argmax(crossing, axis=0)], max_height).tolist()
+    
+    starts = []
+    thicknesses = []
+    z = z_min
+    while z_max - z > min_height * ADAPTIVE_END_TOLERANCE:
+        first_bin = min(int((z - z_min) / bin_size), bin_count - 1)
+        height = max_height
+        while True:
+            last_bin = max(int(math.ceil((z + height - z_min) / bin_size)), first_bin + 1)
+            allowed = min(bin_heights[first_bin:last_bin])
+            if allowed >= height:
+                break
+            height = allowed
+        starts.append(z)
+        thicknesses.append(height)
+        z += height
+        
+    return np.array(starts), np.array(thicknesses)
@@ -31,17 +31,22 @@ class LayerPreview:
         # Draw coordinate axes
         self._draw_axes()
         
-        # Draw perimeters
+        # Draw perimeters, with the wall shells inside them
         perimeter_count = 0
         for polygon in self.current_layer.perimeters:
             self._draw_polygon(polygon, 'blue', 2)
             perimeter_count += 1
+        for polygon in self.current_layer.shells or []:
+            self._draw_polygon(polygon, 'green', 1)
             
-        # Draw infill
+        # Draw infill, solid skin in its own colour
         infill_count = 0
         for infill_line in self.current_layer.infill_lines:
             self._draw_line(infill_line, 'red', 1)
             infill_count += 1
+        for skin_line in self.current_layer.skin_lines:
+            self._draw_line(skin_line, 'orange', 1)
+            infill_count += 1
             
         # Draw layer info
         info_text = f"Layer Z: {self.current_layer.z_height:.2f}mm"
@@ -74,21 +79,22 @@ class LayerPreview:
         """Draw a polygon on the canvas"""
         try:
             if hasattr(polygon, 'exterior'):
-                coords = list(polygon.exterior.coords)
+                rings = [list(polygon.exterior.coords)] + [list(ring.coords) for ring in polygon.interiors]
             else:
-                coords = polygon
-                
-            if len(coords) < 3:
-                return
-                
-            screen_coords = []
-            for x, y in coords:
-                sx, sy = self._world_to_screen(x, y)
-                screen_coords.extend([sx, sy])
-                
-            if len(screen_coords) >= 6:  # At least 3 points
-                self.canvas.create_polygon(screen_coords, outline=color, fill='', width=width)
+                rings = [polygon]
                 
+            for coords in rings:
+                if len(coords) < 3:
+                    continue
+                    
+                screen_coords = []
+                for x, y in coords:
+                    sx, sy = self._world_to_screen(x, y)
+                    screen_coords.extend([sx, sy])
+                    
+                if len(screen_coords) >= 6:  # At least 3 points
+                    self.canvas.create_polygon(screen_coords, outline=color, fill='', width=width)
+                    
         except Exception as e:
             print(f"Error drawing polygon: {e}")
             pass
@@ -1,11 +1,22 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import numpy as np
-from stl_loader import STLLoader
 from slicer_engine import SlicerEngine
 from gcode_generator import GCodeGenerator
+from gcode_encoders import encoder_for_path
+from print_estimator import format_duration
+from pipeline import DEFAULT_SETTINGS, SlicePipeline, load_mesh, run
+from slice_cache import DEFAULT_CACHE_DIR, DEFAULT_CACHE_SIZE, SliceCache
+import argparse
 from layer_preview import LayerPreview
+from infill import INFILL_PATTERNS
+from layer_heights import DEFAULT_MAX_LAYER_HEIGHT, DEFAULT_MIN_LAYER_HEIGHT
+from perimeters import DEFAULT_PERIMETER_COUNT
+from skins import DEFAULT_SKIN_LAYERS
+from mesh_decimation import DEFAULT_PREVIEW_TRIANGLES, decimate
 import os
+import shutil
+import tempfile
 
 class SlicerGUI:
     def __init__(self, root):
@@ -14,14 +25,17 @@ class SlicerGUI:
         self.root.geometry("1000x700")
         
         # Initialize components
-        self.stl_loader = STLLoader()
         self.slicer = SlicerEngine()
         self.gcode_gen = GCodeGenerator()
         
         # Data storage
         self.mesh = None
         self.layers = None
-        self.gcode = None
+        self.gcode_path = None  # Temporary file holding the generated G-code
+        self.gcode_settings = None  # Settings the G-code was generated with
+        self.pipeline = SlicePipeline(cache=SliceCache(), slicer=self.slicer, generator=self.gcode_gen)
+        self.preview_mesh = None  # Decimated copy of large meshes, sliced for the preview
+        self.preview_pipeline = self.pipeline
         
         self.setup_gui()
         
@@ -53,37 +67,62 @@ class SlicerGUI:
         self.layer_height_var = tk.StringVar(value="2.0")  # Increased for better visibility
         ttk.Entry(self.control_frame, textvariable=self.layer_height_var, width=10).grid(row=3, column=1, sticky=tk.E, pady=2)
         
-        ttk.Label(self.control_frame, text="Infill Density (%):").grid(row=4, column=0, sticky=tk.W, pady=2)
-        self.infill_var = tk.StringVar(value="20")
-        ttk.Entry(self.control_frame, textvariable=self.infill_var, width=10).grid(row=4, column=1, sticky=tk.E, pady=2)
+        # Adaptive layers vary between the minimum and maximum height with the surface slope
+        self.adaptive_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.control_frame, text="Adaptive Layer Height", variable=self.adaptive_var).grid(row=4, column=0, columnspan=2, sticky=tk.W, pady=2)
+        
+        ttk.Label(self.control_frame, text="Min Layer Height (mm):").grid(row=5, column=0, sticky=tk.W, pady=2)
+        self.min_layer_height_var = tk.StringVar(value=str(DEFAULT_MIN_LAYER_HEIGHT))
+        ttk.Entry(self.control_frame, textvariable=self.min_layer_height_var, width=10).grid(row=5, column=1, sticky=tk.E, pady=2)
+        
+        ttk.Label(self.control_frame, text="Max Layer Height (mm):").grid(row=6, column=0, sticky=tk.W, pady=2)
+        self.max_layer_height_var = tk.StringVar(value=str(DEFAULT_MAX_LAYER_HEIGHT))
+        ttk.Entry(self.control_frame, textvariable=self.max_layer_height_var, width=10).grid(row=6, column=1, sticky=tk.E, pady=2)
         
-        ttk.Label(self.control_frame, text="Print Speed (mm/s):").grid(row=5, column=0, sticky=tk.W, pady=2)
+        ttk.Label(self.control_frame, text="Infill Density (%):").grid(row=7, column=0, sticky=tk.W, pady=2)
+        self.infill_var = tk.StringVar(value="20")
+        ttk.Entry(self.control_frame, textvariable=self.infill_var, width=10).grid(row=7, column=1, sticky=tk.E, pady=2)
+        
+        ttk.Label(self.control_frame, text="Infill Pattern:").grid(row=8, column=0, sticky=tk.W, pady=2)
+        self.infill_pattern_var = tk.StringVar(value="lines")
+        ttk.Combobox(self.control_frame, textvariable=self.infill_pattern_var, values=list(INFILL_PATTERNS),
+                     state='readonly', width=10).grid(row=8, column=1, sticky=tk.E, pady=2)
+                     
+        ttk.Label(self.control_frame, text="Perimeters:").grid(row=9, column=0, sticky=tk.W, pady=2)
+        self.perimeters_var = tk.StringVar(value=str(DEFAULT_PERIMETER_COUNT))
+        ttk.Entry(self.control_frame, textvariable=self.perimeters_var, width=10).grid(row=9, column=1, sticky=tk.E, pady=2)
+        
+        ttk.Label(self.control_frame, text="Solid Top/Bottom Layers:").grid(row=10, column=0, sticky=tk.W, pady=2)
+        self.skin_layers_var = tk.StringVar(value=str(DEFAULT_SKIN_LAYERS))
+        ttk.Entry(self.control_frame, textvariable=self.skin_layers_var, width=10).grid(row=10, column=1, sticky=tk.E, pady=2)
+        
+        ttk.Label(self.control_frame, text="Print Speed (mm/s):").grid(row=11, column=0, sticky=tk.W, pady=2)
         self.speed_var = tk.StringVar(value="50")
-        ttk.Entry(self.control_frame, textvariable=self.speed_var, width=10).grid(row=5, column=1, sticky=tk.E, pady=2)
+        ttk.Entry(self.control_frame, textvariable=self.speed_var, width=10).grid(row=11, column=1, sticky=tk.E, pady=2)
         
-        ttk.Label(self.control_frame, text="Nozzle Temp (°C):").grid(row=6, column=0, sticky=tk.W, pady=2)
+        ttk.Label(self.control_frame, text="Nozzle Temp (°C):").grid(row=12, column=0, sticky=tk.W, pady=2)
         self.temp_var = tk.StringVar(value="200")
-        ttk.Entry(self.control_frame, textvariable=self.temp_var, width=10).grid(row=6, column=1, sticky=tk.E, pady=2)
+        ttk.Entry(self.control_frame, textvariable=self.temp_var, width=10).grid(row=12, column=1, sticky=tk.E, pady=2)
         
-        ttk.Label(self.control_frame, text="Bed Temp (°C):").grid(row=7, column=0, sticky=tk.W, pady=2)
+        ttk.Label(self.control_frame, text="Bed Temp (°C):").grid(row=13, column=0, sticky=tk.W, pady=2)
         self.bed_temp_var = tk.StringVar(value="60")
-        ttk.Entry(self.control_frame, textvariable=self.bed_temp_var, width=10).grid(row=7, column=1, sticky=tk.E, pady=2)
+        ttk.Entry(self.control_frame, textvariable=self.bed_temp_var, width=10).grid(row=13, column=1, sticky=tk.E, pady=2)
         
         # Process buttons
         self.slice_btn = ttk.Button(self.control_frame, text="Slice Model", command=self.slice_model, state='disabled')
-        self.slice_btn.grid(row=8, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(20, 2))
+        self.slice_btn.grid(row=14, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(20, 2))
         
         self.generate_gcode_btn = ttk.Button(self.control_frame, text="Generate G-Code", command=self.generate_gcode, state='disabled')
-        self.generate_gcode_btn.grid(row=9, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=2)
+        self.generate_gcode_btn.grid(row=15, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=2)
         
         self.save_gcode_btn = ttk.Button(self.control_frame, text="Save G-Code", command=self.save_gcode, state='disabled')
-        self.save_gcode_btn.grid(row=10, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=2)
+        self.save_gcode_btn.grid(row=16, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=2)
         
         # Status and info
-        ttk.Label(self.control_frame, text="Model Info", font=('Arial', 12, 'bold')).grid(row=11, column=0, columnspan=2, pady=(20, 10))
+        ttk.Label(self.control_frame, text="Model Info", font=('Arial', 12, 'bold')).grid(row=17, column=0, columnspan=2, pady=(20, 10))
         
         self.info_text = tk.Text(self.control_frame, height=6, width=25, state='disabled')
-        self.info_text.grid(row=12, column=0, columnspan=2, pady=2)
+        self.info_text.grid(row=18, column=0, columnspan=2, pady=2)
         
         # Right panel for preview
         self.preview_frame = ttk.LabelFrame(self.main_frame, text="Layer Preview", padding="10")
@@ -130,16 +169,31 @@ class SlicerGUI:
                 self.progress.config(value=0)
                 self.root.update()
                 
-                self.mesh = self.stl_loader.load(file_path)
-                print(f"Loaded mesh with {len(self.mesh.triangles)} triangles")
+                self.mesh, report = load_mesh(file_path)
+                self.pipeline.set_mesh(self.mesh)
+                print(f"Loaded mesh with {len(self.mesh.faces)} triangles, repair: {report}")
                 
+                # Large meshes are previewed from a decimated copy, G-code always uses the full mesh
+                self.preview_mesh = self.mesh
+                self.preview_pipeline = self.pipeline
+                if len(self.mesh.faces) > DEFAULT_PREVIEW_TRIANGLES:
+                    self.status_label.config(text="Simplifying mesh for preview...")
+                    self.root.update()
+                    self.preview_mesh = decimate(self.mesh, DEFAULT_PREVIEW_TRIANGLES)
+                    self.preview_pipeline = SlicePipeline(self.preview_mesh, cache=self.pipeline.cache,
+                                                          slicer=self.slicer, generator=self.gcode_gen)
+                    print(f"Preview mesh has {len(self.preview_mesh.faces)} triangles")
+                    
                 # Update info display
                 self.update_model_info()
                 
                 # Enable slice button
                 self.slice_btn.config(state='normal')
                 
-                self.status_label.config(text=f"Loaded: {os.path.basename(file_path)}")
+                status = f"Loaded: {os.path.basename(file_path)}"
+                if report.changed or report.open_holes:
+                    status += f" ({report})"
+                self.status_label.config(text=status)
                 self.progress.config(value=100)
                 
             except Exception as e:
@@ -154,7 +208,7 @@ class SlicerGUI:
         bounds = self.mesh.bounds
         size = bounds[1] - bounds[0]
         
-        info = f"Triangles: {len(self.mesh.triangles)}\n"
+        info = f"Triangles: {len(self.mesh.faces)}\n"
         info += f"Size (mm):\n"
         info += f"  X: {size[0]:.1f}\n"
         info += f"  Y: {size[1]:.1f}\n"
@@ -166,24 +220,49 @@ class SlicerGUI:
         self.info_text.insert(1.0, info)
         self.info_text.config(state='disabled')
         
+    def get_settings(self):
+        """Read the slicer and printer settings from the controls"""
+        return {
+            'layer_height': float(self.layer_height_var.get()),
+            'adaptive_layers': self.adaptive_var.get(),
+            'min_layer_height': float(self.min_layer_height_var.get()),
+            'max_layer_height': float(self.max_layer_height_var.get()),
+            'infill_density': float(self.infill_var.get()) / 100.0,
+            'infill_pattern': self.infill_pattern_var.get(),
+            'perimeter_count': int(self.perimeters_var.get()),
+            'skin_layers': int(self.skin_layers_var.get()),
+            'print_speed': float(self.speed_var.get()),
+            'nozzle_temp': int(self.temp_var.get()),
+            'bed_temp': int(self.bed_temp_var.get())
+        }
+        
     def slice_model(self):
         if self.mesh is None:
             return
             
         try:
-            layer_height = float(self.layer_height_var.get())
+            settings = self.get_settings()
             
             self.status_label.config(text="Slicing model...")
             self.progress.config(value=0)
             self.root.update()
             
-            self.layers = self.slicer.slice(self.mesh, layer_height, progress_callback=self.update_progress)
+            # The full mesh is sliced when G-code is generated, until then the preview mesh is shown
+            pipeline = self.pipeline
+            if pipeline.stale_stage(settings) in ('contours', 'infill'):
+                pipeline = self.preview_pipeline
+            self.layers, stage = pipeline.slice(settings, progress_callback=self.update_progress)
             print(f"Created {len(self.layers)} layers")
             
+            # The G-code of the old layers is out of date
+            if stage is not None:
+                self.remove_gcode_file()
+                self.save_gcode_btn.config(state='disabled')
+                
             # Debug: Check first few layers
             for i, layer in enumerate(self.layers[:3]):
                 print(f"Layer {i}: {len(layer.perimeters)} perimeters, {len(layer.infill_lines)} infill lines")
-            
+                
             # Update layer navigation
             if self.layers:
                 self.layer_scale.config(to=len(self.layers)-1, state='normal')
@@ -193,7 +272,14 @@ class SlicerGUI:
                 # Enable G-code generation
                 self.generate_gcode_btn.config(state='normal')
                 
-            self.status_label.config(text=f"Sliced into {len(self.layers)} layers")
+            if stage == 'infill':
+                self.status_label.config(text=f"Regenerated infill of {len(self.layers)} layers")
+            elif stage is None:
+                self.status_label.config(text=f"{len(self.layers)} layers are up to date")
+            else:
+                self.status_label.config(text=f"Sliced into {len(self.layers)} layers")
+            if pipeline is not self.pipeline:
+                self.status_label.config(text=self.status_label.cget('text') + " (simplified preview)")
             self.progress.config(value=100)
             
         except Exception as e:
@@ -206,45 +292,77 @@ class SlicerGUI:
             return
             
         try:
-            settings = {
-                'layer_height': float(self.layer_height_var.get()),
-                'infill_density': float(self.infill_var.get()) / 100.0,
-                'print_speed': float(self.speed_var.get()),
-                'nozzle_temp': int(self.temp_var.get()),
-                'bed_temp': int(self.bed_temp_var.get())
-            }
-            
-            self.status_label.config(text="Generating G-code...")
+            settings = self.get_settings()
+            if self.gcode_path is not None and self.pipeline.stale_stage(settings) is None:
+                self.status_label.config(text="G-code is up to date")
+                return
+                
+            # The full mesh may need slicing first, only the preview mesh was sliced so far
+            slicing = self.pipeline.stale_stage(settings) in ('contours', 'infill')
+            self.status_label.config(text="Slicing the full model..." if slicing else "Generating G-code...")
             self.progress.config(value=0)
             self.root.update()
             
-            self.gcode = self.gcode_gen.generate(self.layers, settings, progress_callback=self.update_progress)
+            def gcode_progress(value):
+                self.status_label.config(text="Generating G-code...")
+                self.update_progress(value)
+                
+            # Stream the G-code into a temporary file instead of keeping it in memory
+            self.remove_gcode_file()
+            with tempfile.NamedTemporaryFile('wb', suffix='.gcode', delete=False) as f:
+                self.gcode_path = f.name
+                counters = self.pipeline.generate_to(f, settings, progress_callback=gcode_progress,
+                                                     slice_progress_callback=self.update_progress)
+            self.gcode_settings = settings
             
+            # Layer or infill settings changed since slicing, show the new layers
+            if self.pipeline.layers is not self.layers:
+                self.layers = self.pipeline.layers
+                self.layer_scale.config(to=len(self.layers)-1)
+                self.update_layer_preview()
+                
             # Enable save button
             self.save_gcode_btn.config(state='normal')
             
-            self.status_label.config(text=f"Generated {len(self.gcode.split(chr(10)))} lines of G-code")
+            self.status_label.config(text=f"Generated {counters['lines']} lines of G-code, "
+                                          f"travel {counters['travel']:.0f} mm (unordered {counters['unoptimized_travel']:.0f} mm), "
+                                          f"est. {format_duration(counters['print_time'])}, "
+                                          f"{counters['filament_mass']:.1f} g filament")
             self.progress.config(value=100)
             
         except Exception as e:
             messagebox.showerror("Error", f"Failed to generate G-code:\n{str(e)}")
             self.status_label.config(text="Error generating G-code")
             
+    def remove_gcode_file(self):
+        """Delete the temporary G-code file of a previous run"""
+        if self.gcode_path is not None and os.path.exists(self.gcode_path):
+            os.remove(self.gcode_path)
+        self.gcode_path = None
+        
     def save_gcode(self):
-        if self.gcode is None:
+        if self.gcode_path is None:
             return
             
         file_path = filedialog.asksaveasfilename(
             title="Save G-Code File",
             defaultextension=".gcode",
-            filetypes=[("G-code files", "*.gcode"), ("All files", "*.*")]
+            filetypes=[("G-code files", "*.gcode"), ("Compressed G-code", "*.gcode.gz"),
+                       ("Binary G-code", "*.gcdb"), ("All files", "*.*")]
         )
         
         if file_path:
             try:
-                with open(file_path, 'w') as f:
-                    f.write(self.gcode)
-                    
+                with open(file_path, 'wb') as f:
+                    encoder = encoder_for_path(file_path, f)
+                    if encoder is None:
+                        with open(self.gcode_path, 'rb') as source:
+                            shutil.copyfileobj(source, f)
+                    else:
+                        # Encoders need the layer boundaries, so the layers are streamed again
+                        with encoder:
+                            self.gcode_gen.generate_to(encoder, self.pipeline.layers, self.gcode_settings)
+                            
                 self.status_label.config(text=f"Saved: {os.path.basename(file_path)}")
                 messagebox.showinfo("Success", "G-code saved successfully!")
                 
@@ -266,10 +384,65 @@ class SlicerGUI:
         self.progress.config(value=value)
         self.root.update()
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Slice an STL file, without arguments the GUI is started")
+    parser.add_argument('stl', nargs='?', help="STL file to slice")
+    parser.add_argument('output', nargs='?', help="G-code file to write (.gcode, .gcode.gz or .gcdb)")
+    parser.add_argument('--layer-height', type=float, default=DEFAULT_SETTINGS['layer_height'])
+    parser.add_argument('--adaptive', action='store_true',
+                        help="Vary the layer height with the surface slope between the minimum and maximum")
+    parser.add_argument('--min-layer-height', type=float, default=DEFAULT_MIN_LAYER_HEIGHT)
+    parser.add_argument('--max-layer-height', type=float, default=DEFAULT_MAX_LAYER_HEIGHT)
+    parser.add_argument('--infill', type=float, default=DEFAULT_SETTINGS['infill_density'] * 100,
+                        help="Infill density in percent")
+    parser.add_argument('--infill-pattern', choices=sorted(INFILL_PATTERNS), default=DEFAULT_SETTINGS['infill_pattern'])
+    parser.add_argument('--perimeters', type=int, default=DEFAULT_PERIMETER_COUNT, help="Wall shells per contour")
+    parser.add_argument('--skin-layers', type=int, default=DEFAULT_SKIN_LAYERS,
+                        help="Solid layers at top and bottom surfaces")
+    parser.add_argument('--speed', type=float, default=DEFAULT_SETTINGS['print_speed'], help="Print speed in mm/s")
+    parser.add_argument('--nozzle-temp', type=int, default=DEFAULT_SETTINGS['nozzle_temp'])
+    parser.add_argument('--bed-temp', type=int, default=DEFAULT_SETTINGS['bed_temp'])
+    parser.add_argument('--workers', type=int, default=None, help="Processes used for slicing and G-code")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE // (1024 * 1024),
+                        help="Slice cache size limit in MiB")
+    parser.add_argument('--no-cache', action='store_true', help="Always slice from scratch")
+    parser.add_argument('--no-repair', action='store_true', help="Slice the mesh as loaded, without welding or fixing it")
+    return parser.parse_args(argv)
+
+def run_headless(args):
+    """Slice args.stl into args.output and print a summary"""
+    settings = {
+        'layer_height': args.layer_height,
+        'adaptive_layers': args.adaptive,
+        'min_layer_height': args.min_layer_height,
+        'max_layer_height': args.max_layer_height,
+        'infill_density': args.infill / 100.0,
+        'infill_pattern': args.infill_pattern,
+        'perimeter_count': args.perimeters,
+        'skin_layers': args.skin_layers,
+        'print_speed': args.speed,
+        'nozzle_temp': args.nozzle_temp,
+        'bed_temp': args.bed_temp
+    }
+    cache = None if args.no_cache else SliceCache(args.cache_dir, args.cache_size * 1024 * 1024)
+    counters = run(args.stl, args.output, settings, cache, args.workers, repair=not args.no_repair)
+    print(f"Wrote {counters['layers']} layers, {counters['lines']} lines to {args.output}")
+    print(f"Estimated print time {format_duration(counters['print_time'])}, "
+          f"filament {counters['extrusion'] / 1000.0:.2f} m ({counters['filament_mass']:.1f} g)")
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.stl:
+        if not args.output:
+            args.output = os.path.splitext(args.stl)[0] + '.gcode'
+        run_headless(args)
+        return
+        
     root = tk.Tk()
     app = SlicerGUI(root)
     root.mainloop()
+    app.remove_gcode_file()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,258 @@
+import numpy as np
+
+# Vertices closer than this (in mm) are merged when building the indexed form
+WELD_TOLERANCE = 1e-4
+
+class EdgeAdjacency:
+    """Edge to face adjacency of an indexed mesh
+    
+    Edges are the unique undirected vertex pairs of the faces. face_edges[f, k]
+    is the edge from faces[f, k] to faces[f, (k + 1) % 3], and the faces around
+    edge e are edge_face_list[edge_face_offsets[e]:edge_face_offsets[e + 1]].
+    """
+    def __init__(self, faces, vertex_count):
+        face_count = len(faces)
+        
+        # Half-edges in face order, normalized so the lower vertex index comes first
+        half_edges = np.stack([faces, np.roll(faces, -1, axis=1)], axis=2).reshape(-1, 2)
+        low = half_edges.min(axis=1).astype(np.int64)
+        high = half_edges.max(axis=1).astype(np.int64)
+        
+        edge_keys, inverse = np.unique(low * vertex_count + high, return_inverse=True)
+        inverse = inverse.ravel()
+        self.edges = np.stack([edge_keys // vertex_count, edge_keys % vertex_count], axis=1).astype(np.int32)
+        self.face_edges = inverse.reshape(face_count, 3).astype(np.int32)
+        
+        # CSR table of the faces around every edge
+        order = np.argsort(inverse, kind='stable')
+        counts = np.bincount(inverse, minlength=len(self.edges))
+        self.edge_face_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self.edge_face_list = (order // 3).astype(np.int32)
+        self.edge_face_counts = counts
+        
+        # Neighbour across each face edge, -1 on boundary and non-manifold edges
+        self.face_neighbors = np.full(face_count * 3, -1, dtype=np.int32)
+        manifold = np.flatnonzero(counts == 2)
+        first = order[self.edge_face_offsets[manifold]]
+        second = order[self.edge_face_offsets[manifold] + 1]
+        self.face_neighbors[first] = second // 3
+        self.face_neighbors[second] = first // 3
+        self.face_neighbors = self.face_neighbors.reshape(face_count, 3)
+        
+    def faces_of_edge(self, edge):
+        """Return the indices of the faces sharing an edge"""
+        return self.edge_face_list[self.edge_face_offsets[edge]:self.edge_face_offsets[edge + 1]]
+        
+    @property
+    def boundary_edges(self):
+        """Indices of edges used by a single face"""
+        return np.flatnonzero(self.edge_face_counts == 1)
+
+class Mesh:
+    def __init__(self, triangles):
+        # asarray keeps views (e.g. memory mapped STL records) without copying
+        self._triangles = np.asarray(triangles)
+        self._vertices = None
+        self._faces = None
+        self._invalidate()
+        
+    @classmethod
+    def from_indexed(cls, vertices, faces):
+        """Create a mesh that only stores unique vertices and (N, 3) face indices"""
+        mesh = cls.__new__(cls)
+        mesh._triangles = None
+        mesh._vertices = np.asarray(vertices)
+        mesh._faces = np.asarray(faces, dtype=np.int32)
+        mesh._invalidate()
+        return mesh
+        
+    def _invalidate(self):
+        """Drop everything derived from the geometry"""
+        self._bounds = None
+        self._adjacency = None
+        self._face_normals = None
+        self._face_areas = None
+        self._face_z_extent = None
+        self._signed_volume = None
+        self._centroid = None
+        
+    @property
+    def triangles(self):
+        """(N, 3, 3) triangle soup, built on access for indexed meshes"""
+        if self._triangles is None:
+            return self._vertices[self._faces]
+        return self._triangles
+        
+    @triangles.setter
+    def triangles(self, triangles):
+        self._triangles = np.asarray(triangles)
+        self._vertices = None
+        self._faces = None
+        self._invalidate()
+        
+    @property
+    def vertices(self):
+        if self._vertices is None:
+            self.weld()
+        return self._vertices
+        
+    @property
+    def faces(self):
+        if self._faces is None:
+            self.weld()
+        return self._faces
+        
+    @property
+    def adjacency(self):
+        """Lazily built EdgeAdjacency of the indexed form"""
+        if self._adjacency is None:
+            self._adjacency = EdgeAdjacency(self.faces, len(self.vertices))
+        return self._adjacency
+        
+    def weld(self, tolerance=WELD_TOLERANCE):
+        """Build the indexed form by merging vertices that share a grid cell
+        
+        Coordinates are snapped to a grid of the given tolerance and the cell
+        keys are grouped, so welding is a single sort over all corners rather
+        than pairwise coordinate comparisons. Indexed meshes are welded again
+        from their expanded triangles.
+        """
+        corners = self.triangles.reshape(-1, 3)
+        if len(corners) == 0:
+            self._vertices = np.empty((0, 3), dtype=corners.dtype)
+            self._faces = np.empty((0, 3), dtype=np.int32)
+            return self
+            
+        _, first, inverse = np.unique(grid_keys(corners, tolerance), return_index=True, return_inverse=True)
+        
+        self._vertices = corners[first]
+        self._faces = inverse.reshape(-1, 3).astype(np.int32)
+        self._adjacency = None
+        return self
+        
+    def to_indexed(self, tolerance=WELD_TOLERANCE):
+        """Return a welded copy that drops the triangle soup to save memory"""
+        if self._triangles is not None:
+            self.weld(tolerance)
+        return Mesh.from_indexed(self._vertices, self._faces)
+        
+    @property
+    def bounds(self):
+        if self._bounds is None:
+            vertices = self.triangles.reshape(-1, 3) if self._vertices is None else self._vertices
+            self._bounds = np.array([vertices.min(axis=0), vertices.max(axis=0)])
+        return self._bounds
+        
+    def _compute_metrics(self):
+        """Compute all per-face and whole-mesh metrics in one pass over the faces"""
+        triangles = self.triangles.astype(np.float64)
+        v0, v1, v2 = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+        
+        # Per-face normal and area from the edge cross product
+        cross = np.cross(v1 - v0, v2 - v0)
+        double_areas = np.linalg.norm(cross, axis=1)
+        self._face_areas = double_areas / 2.0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self._face_normals = np.where(double_areas[:, None] > 0, cross / double_areas[:, None], 0.0)
+            
+        z = triangles[:, :, 2]
+        self._face_z_extent = np.stack([z.min(axis=1), z.max(axis=1)], axis=1)
+        
+        # Signed tetrahedron volumes against the origin (divergence theorem)
+        tetra_volumes = np.einsum('ij,ij->i', v0, np.cross(v1, v2)) / 6.0
+        self._signed_volume = tetra_volumes.sum()
+        
+        face_centers = triangles.sum(axis=1) / 3.0
+        if abs(self._signed_volume) > 1e-12:
+            # Volume weighted tetrahedron centroids, the origin is the fourth vertex
+            self._centroid = (tetra_volumes @ (face_centers * 0.75)) / self._signed_volume
+        elif self._face_areas.sum() > 0:
+            # Open or flat surface, fall back to the area weighted centroid
+            self._centroid = (self._face_areas @ face_centers) / self._face_areas.sum()
+        else:
+            self._centroid = face_centers.mean(axis=0) if len(face_centers) else np.zeros(3)
+            
+    @property
+    def face_normals(self):
+        """(N, 3) unit normals following the vertex winding, zero for degenerate faces"""
+        if self._face_normals is None:
+            self._compute_metrics()
+        return self._face_normals
+        
+    @property
+    def face_areas(self):
+        if self._face_areas is None:
+            self._compute_metrics()
+        return self._face_areas
+        
+    @property
+    def face_z_extent(self):
+        """(N, 2) minimum and maximum Z of every face"""
+        if self._face_z_extent is None:
+            self._compute_metrics()
+        return self._face_z_extent
+        
+    @property
+    def signed_volume(self):
+        """Enclosed volume, negative when the faces are wound inwards"""
+        if self._signed_volume is None:
+            self._compute_metrics()
+        return self._signed_volume
+        
+    @property
+    def volume(self):
+        return abs(self.signed_volume)
+        
+    @property
+    def area(self):
+        return self.face_areas.sum()
+        
+    @property
+    def centroid(self):
+        if self._centroid is None:
+            self._compute_metrics()
+        return self._centroid
+        
+    def transform(self, matrix):
+        """Apply a 3x3 linear or 4x4 affine transform in place"""
+        matrix = np.asarray(matrix, dtype=np.float64)
+        linear = matrix[:3, :3]
+        offset = matrix[:3, 3] if matrix.shape == (4, 4) else np.zeros(3)
+        
+        # New arrays are assigned rather than written in place, the triangles
+        # may be a read-only view of a memory mapped file
+        if self._triangles is not None:
+            self._triangles = self._triangles @ linear.T + offset
+        if self._vertices is not None:
+            self._vertices = self._vertices @ linear.T + offset
+        self._invalidate()
+        
+        # A mirroring transform flips the winding, keep the faces outward
+        if np.linalg.det(linear) < 0:
+            if self._triangles is not None:
+                self._triangles = self._triangles[:, ::-1]
+            if self._faces is not None:
+                self._faces = self._faces[:, ::-1].copy()
+        return self
+        
+    def translate(self, offset):
+        matrix = np.eye(4)
+        matrix[:3, 3] = offset
+        return self.transform(matrix)
+        
+    def scale(self, factor):
+        return self.transform(np.diag(np.broadcast_to(np.asarray(factor, dtype=np.float64), (3,))))
+
+def grid_keys(points, tolerance):
+    """Return one comparable key per point for its cell in a grid of given size"""
+    cells = np.floor(points / tolerance + 0.5).astype(np.int64)
+    cells -= cells.min(axis=0)
+    span = cells.max(axis=0) + 1
+    
+    # Pack the cell indices into one integer when they fit, which is exact
+    if np.log2(span.astype(np.float64)).sum() < 62:
+        keys = cells[:, 0]
+        for axis in range(1, cells.shape[1]):
+            keys = keys * span[axis] + cells[:, axis]
+        return keys
+    return np.ascontiguousarray(cells).view(np.dtype((np.void, 8 * cells.shape[1]))).ravel()
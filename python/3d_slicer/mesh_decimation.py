@@ -0,0 +1,135 @@
+import numpy as np
+from mesh import Mesh, grid_keys
+
+# Triangle budget of the mesh the GUI slices for its preview
+DEFAULT_PREVIEW_TRIANGLES = 200000
+
+# Grid refinements tried to bring the triangle count within the budget
+DECIMATION_MAX_STEPS = 8
+
+# Accept a grid once it keeps at least this fraction of the budget
+DECIMATION_BUDGET_FILL = 0.8
+
+# Relative size below which quadric eigenvalues are ignored when placing a vertex
+QUADRIC_RCOND = 1e-3
+
+# Weight of the planes that hold open boundary edges in place
+BOUNDARY_WEIGHT = 10.0
+
+def decimate(mesh, target_triangles):
+    """Return a copy of mesh with at most target_triangles faces
+    
+    Quadric error vertex clustering: the welded vertices are grouped on a
+    grid whose cell size is searched until the collapsed mesh fits the
+    budget, and every cluster becomes one vertex placed where the summed
+    plane quadrics of its faces are smallest. Open boundary edges add planes
+    across them so holes and edges keep their outline. All of this is array
+    work over the indexed form of the mesh, so millions of faces take seconds.
+    Faces keep their winding, faces collapsed to an edge or a point and
+    duplicates are dropped.
+    """
+    vertices = np.asarray(mesh.vertices, dtype=np.float64)
+    faces = mesh.faces
+    if len(faces) <= target_triangles:
+        return Mesh.from_indexed(vertices, faces)
+        
+    # First guess: a cell per vertex of a surface with the target face count
+    area = max(mesh.area, 1e-12)
+    cell_size = np.sqrt(2.0 * area / target_triangles)
+    
+    for _ in range(DECIMATION_MAX_STEPS):
+        clusters, new_faces = _cluster(vertices, faces, cell_size)
+        count = len(new_faces)
+        if DECIMATION_BUDGET_FILL * target_triangles <= count <= target_triangles:
+            break
+        # The face count falls with the square of the cell size, aim inside the accepted range
+        aim = (1.0 + DECIMATION_BUDGET_FILL) / 2 * target_triangles
+        cell_size *= np.sqrt(max(count, 1) / aim)
+    while len(new_faces) > target_triangles:
+        cell_size *= 1.1
+        clusters, new_faces = _cluster(vertices, faces, cell_size)
+        
+    positions = _place_vertices(mesh, vertices, faces, clusters)
+    
+    # Keep only the clusters still used by a face
+    used, new_faces = np.unique(new_faces, return_inverse=True)
+    return Mesh.from_indexed(positions[used], new_faces.reshape(-1, 3))
+
+def _cluster(vertices, faces, cell_size):
+    """Cluster id of every vertex and the faces left after merging the clusters"""
+    _, clusters = np.unique(grid_keys(vertices, cell_size), return_inverse=True)
+    clusters = clusters.ravel()
+    new_faces = clusters[faces]
+    
+    a, b, c = new_faces[:, 0], new_faces[:, 1], new_faces[:, 2]
+    new_faces = new_faces[(a != b) & (b != c) & (c != a)]
+    
+    # Faces over the same three clusters, in either winding, are kept once
+    _, first = np.unique(np.sort(new_faces, axis=1), axis=0, return_index=True)
+    return clusters, new_faces[np.sort(first)]
+
+def _place_vertices(mesh, vertices, faces, clusters):
+    """Position of every cluster minimizing the summed squared distance to its planes"""
+    cluster_count = int(clusters.max()) + 1
+    
+    # Area weighted face planes n . x + d = 0, added to the clusters of all three corners
+    triangles = vertices[faces]
+    cross = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    double_areas = np.linalg.norm(cross, axis=1)
+    normals = cross / np.where(double_areas > 0, double_areas, 1.0)[:, None]
+    offsets = -np.einsum('ij,ij->i', normals, triangles[:, 0])
+    weights = double_areas / 2.0
+    
+    plane_clusters = [clusters[faces].ravel()]
+    plane_normals = [np.repeat(normals, 3, axis=0)]
+    plane_offsets = [np.repeat(offsets, 3)]
+    plane_weights = [np.repeat(weights, 3)]
+    
+    # Planes through open boundary edges, perpendicular to their face
+    adjacency = mesh.adjacency
+    boundary = adjacency.boundary_edges
+    if len(boundary):
+        edges = adjacency.edges[boundary]
+        edge_faces = adjacency.edge_face_list[adjacency.edge_face_offsets[boundary]]
+        direction = vertices[edges[:, 1]] - vertices[edges[:, 0]]
+        lengths = np.linalg.norm(direction, axis=1)
+        across = np.cross(direction, normals[edge_faces])
+        across_lengths = np.linalg.norm(across, axis=1)
+        across = across / np.where(across_lengths > 0, across_lengths, 1.0)[:, None]
+        across_offsets = -np.einsum('ij,ij->i', across, vertices[edges[:, 0]])
+        for end in (0, 1):
+            plane_clusters.append(clusters[edges[:, end]])
+            plane_normals.append(across)
+            plane_offsets.append(across_offsets)
+            plane_weights.append(BOUNDARY_WEIGHT * lengths * lengths)
+            
+    plane_clusters = np.concatenate(plane_clusters)
+    plane_normals = np.concatenate(plane_normals)
+    plane_offsets = np.concatenate(plane_offsets)
+    plane_weights = np.concatenate(plane_weights)
+    
+    # Quadric sums: A = sum w n n^T, b = sum w d n
+    quadric_a = np.empty((cluster_count, 3, 3))
+    quadric_b = np.empty((cluster_count, 3))
+    for i in range(3):
+        weighted = plane_weights * plane_normals[:, i]
+        quadric_b[:, i] = np.bincount(plane_clusters, weighted * plane_offsets, minlength=cluster_count)
+        for j in range(i, 3):
+            quadric_a[:, i, j] = quadric_a[:, j, i] = np.bincount(plane_clusters, weighted * plane_normals[:, j],
+                                                                  minlength=cluster_count)
+                                                                  
+    # Solve A x = -b around the mean of the cluster, directions the planes do
+    # not constrain (flat or straight regions) keep the mean
+    counts = np.bincount(clusters, minlength=cluster_count)[:, None]
+    centers = np.stack([np.bincount(clusters, vertices[:, k], minlength=cluster_count)
+                        for k in range(3)], axis=1) / np.maximum(counts, 1)
+    residual = -(np.einsum('cij,cj->ci', quadric_a, centers) + quadric_b)
+    positions = centers + np.einsum('cij,cj->ci', np.linalg.pinv(quadric_a, rcond=QUADRIC_RCOND, hermitian=True),
+                                    residual)
+                                    
+    # Never leave the box of the merged vertices
+    low = np.full((cluster_count, 3), np.inf)
+    high = np.full((cluster_count, 3), -np.inf)
+    np.minimum.at(low, clusters, vertices)
+    np.maximum.at(high, clusters, vertices)
+    return np.clip(positions, low, high)
@@ -0,0 +1,226 @@
+import numpy as np
+from mesh import WELD_TOLERANCE, EdgeAdjacency, Mesh, grid_keys
+
+# Holes with at most this many boundary edges are closed
+DEFAULT_MAX_HOLE_EDGES = 256
+
+# Offsets in cells of the extra hash grids that catch near-duplicates split by a cell border
+WELD_GRID_SHIFTS = [(x, y, z) for x in (0.0, 0.5) for y in (0.0, 0.5) for z in (0.0, 0.5)][1:]
+
+class RepairReport:
+    """What repair_mesh changed, str() gives a one line summary"""
+    def __init__(self):
+        self.welded_corners = 0     # Corners moved onto a near-duplicate vertex
+        self.degenerate_faces = 0   # Faces without area that were dropped
+        self.duplicate_faces = 0    # Repeated faces that were dropped
+        self.flipped_faces = 0      # Faces whose winding was reversed
+        self.filled_holes = 0
+        self.fill_faces = 0         # Faces added to close the holes
+        self.open_holes = 0         # Holes too large or not simple enough to close
+        
+    @property
+    def changed(self):
+        return any([self.welded_corners, self.degenerate_faces, self.duplicate_faces,
+                    self.flipped_faces, self.filled_holes])
+                    
+    def __str__(self):
+        if not self.changed and not self.open_holes:
+            return "No problems found"
+        parts = []
+        if self.welded_corners:
+            parts.append("welded {} corners".format(self.welded_corners))
+        if self.degenerate_faces or self.duplicate_faces:
+            parts.append("dropped {} degenerate and {} duplicate faces".format(self.degenerate_faces,
+                                                                             self.duplicate_faces))
+        if self.flipped_faces:
+            parts.append("flipped {} faces".format(self.flipped_faces))
+        if self.filled_holes:
+            parts.append("filled {} holes with {} faces".format(self.filled_holes, self.fill_faces))
+        if self.open_holes:
+            parts.append("{} holes left open".format(self.open_holes))
+        text = ", ".join(parts)
+        return text[0].upper() + text[1:]
+
+def repair_mesh(mesh, tolerance=WELD_TOLERANCE, max_hole_edges=DEFAULT_MAX_HOLE_EDGES):
+    """Return a repaired indexed copy of mesh and a RepairReport
+    
+    Vertices within tolerance are welded on a hash grid, faces without area
+    and repeated faces are dropped, the winding is made consistent across
+    every connected part and turned outwards, and boundary loops of up to
+    max_hole_edges edges are closed with a fan around their centre. Every
+    step is a sort or a sweep over array data, so the time grows close to
+    linearly with the face count.
+    """
+    report = RepairReport()
+    vertices, faces, report.welded_corners = _weld(mesh.triangles, tolerance)
+    
+    faces, report.degenerate_faces = _drop_degenerate(vertices, faces, tolerance)
+    faces, report.duplicate_faces = _drop_duplicates(faces)
+    if len(faces):
+        faces, report.flipped_faces = _orient_faces(vertices, faces)
+        vertices, faces = _fill_holes(vertices, faces, max_hole_edges, report)
+        
+    # Drop vertices no face uses any more
+    used, faces = np.unique(faces, return_inverse=True)
+    return Mesh.from_indexed(vertices[used], faces.reshape(-1, 3)), report
+
+def _weld(triangles, tolerance):
+    """Merge corners closer than tolerance, returns vertices, faces and the number of moved corners
+    
+    Mesh.weld merges the corners sharing a cell of a hash grid. Two close
+    corners on either side of a cell border are merged by one of the grids
+    shifted by half a cell along some of the axes, so these are hashed too
+    and all merges are joined with union-find.
+    """
+    corners = triangles.reshape(-1, 3)
+    welded = Mesh(triangles).weld(tolerance)
+    vertices = welded.vertices.astype(np.float64)
+    faces = welded.faces
+    
+    if len(vertices):
+        a = []
+        b = []
+        for shift in WELD_GRID_SHIFTS:
+            _, first, cells = np.unique(grid_keys(vertices + np.multiply(shift, tolerance), tolerance),
+                                        return_index=True, return_inverse=True)
+            a.append(np.arange(len(vertices)))
+            b.append(first[cells.ravel()])
+        roots = _union_find(len(vertices), np.concatenate(a), np.concatenate(b))
+        used, remap = np.unique(roots, return_inverse=True)
+        vertices = vertices[used]
+        faces = remap.ravel()[faces].astype(np.int32)
+        
+    moved = (vertices[faces.ravel()] != corners).any(axis=1)
+    return vertices, faces, int(np.count_nonzero(moved))
+
+def _drop_degenerate(vertices, faces, tolerance):
+    """Drop faces thinner than tolerance, which includes faces with a repeated vertex"""
+    triangles = vertices[faces]
+    edges = np.roll(triangles, -1, axis=1) - triangles
+    longest = np.linalg.norm(edges, axis=2).max(axis=1)
+    double_areas = np.linalg.norm(np.cross(edges[:, 0], edges[:, 1]), axis=1)
+    
+    # Twice the area over the longest edge is the height of the triangle
+    keep = double_areas > tolerance * longest
+    return faces[keep], int(len(faces) - np.count_nonzero(keep))
+
+def _drop_duplicates(faces):
+    """Keep the first of the faces over the same three vertices, in either winding"""
+    _, first = np.unique(np.sort(faces, axis=1), axis=0, return_index=True)
+    return faces[np.sort(first)], int(len(faces) - len(first))
+
+def _orient_faces(vertices, faces):
+    """Make neighbouring faces agree on their winding and point every part outwards
+    
+    A breadth first search over the edge adjacency starts at the first face
+    of every connected part, with all parts advancing together one ring of
+    faces per step. A face is flipped relative to the face it is reached
+    from when both run their shared edge in the same direction. Parts that
+    then enclose a negative volume are turned inside out.
+    """
+    face_count = len(faces)
+    adjacency = EdgeAdjacency(faces, len(vertices))
+    neighbors = adjacency.face_neighbors
+    has_neighbor = neighbors >= 0
+    
+    # Whether the neighbour across each edge runs it in the same direction
+    across = np.where(has_neighbor, neighbors, 0)
+    neighbor_slot = np.argmax(adjacency.face_edges[across] == adjacency.face_edges[:, :, None], axis=2)
+    same_direction = has_neighbor & (faces == faces[across, neighbor_slot])
+    
+    rows, columns = np.nonzero(has_neighbor)
+    labels = _union_find(face_count, rows, neighbors[rows, columns])
+    flip = np.zeros(face_count, dtype=bool)
+    visited = labels == np.arange(face_count)
+    frontier = np.flatnonzero(visited)
+    while len(frontier):
+        reached = neighbors[frontier]
+        reached_flip = flip[frontier][:, None] ^ same_direction[frontier]
+        new = has_neighbor[frontier] & ~visited[np.where(reached >= 0, reached, 0)]
+        frontier, first = np.unique(reached[new], return_index=True)
+        flip[frontier] = reached_flip[new][first]
+        visited[frontier] = True
+        
+    # Turn parts with a negative signed volume outwards
+    triangles = vertices[faces]
+    volumes = np.einsum('ij,ij->i', triangles[:, 0], np.cross(triangles[:, 1], triangles[:, 2]))
+    volumes = np.where(flip, -volumes, volumes)
+    flip ^= (np.bincount(labels, volumes, minlength=face_count) < 0)[labels]
+    
+    faces = faces.copy()
+    faces[flip] = faces[flip][:, ::-1]
+    return faces, int(np.count_nonzero(flip))
+
+def _union_find(count, a, b):
+    """Label each of count items with the lowest item connected to it by the pairs (a, b)
+    
+    Union-find on arrays: every round hooks the root of each pair onto the
+    smaller root at its other end, then compresses all paths, which joins
+    the groups in a logarithmic number of rounds.
+    """
+    parent = np.arange(count)
+    while True:
+        root_a, root_b = parent[a], parent[b]
+        joined = root_a != root_b
+        if not joined.any():
+            return parent
+        np.minimum.at(parent, np.maximum(root_a, root_b)[joined], np.minimum(root_a, root_b)[joined])
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+
+def _fill_holes(vertices, faces, max_hole_edges, report):
+    """Close simple boundary loops with a fan of faces around a new centre vertex"""
+    adjacency = EdgeAdjacency(faces, len(vertices))
+    boundary = adjacency.boundary_edges
+    if not len(boundary):
+        return vertices, faces
+        
+    # Boundary edges as their face runs them, the hole is walked the other way
+    edge_faces = adjacency.edge_face_list[adjacency.edge_face_offsets[boundary]]
+    slots = np.argmax(adjacency.face_edges[edge_faces] == boundary[:, None], axis=1)
+    hole_from = faces[edge_faces, (slots + 1) % 3]
+    hole_to = faces[edge_faces, slots]
+    
+    # Holes touching at a vertex are not simple, they are left open
+    pinched = np.bincount(hole_from, minlength=len(vertices)) > 1
+    next_vertex = dict(zip(hole_from.tolist(), hole_to.tolist()))
+    
+    new_vertices = []
+    new_faces = []
+    walked = set()
+    for start in hole_from.tolist():
+        if start in walked:
+            continue
+        loop = [start]
+        walked.add(start)
+        simple = not pinched[start]
+        vertex = next_vertex.get(start)
+        while vertex != start:
+            if vertex is None or vertex in walked:
+                simple = False
+                break
+            loop.append(vertex)
+            walked.add(vertex)
+            simple = simple and not pinched[vertex]
+            vertex = next_vertex.get(vertex)
+            
+        if not simple or len(loop) > max_hole_edges:
+            report.open_holes += 1
+            continue
+        report.filled_holes += 1
+        if len(loop) == 3:
+            new_faces.append(loop)
+            continue
+        centre = len(vertices) + len(new_vertices)
+        new_vertices.append(vertices[loop].mean(axis=0))
+        new_faces.extend([loop[i], loop[(i + 1) % len(loop)], centre] for i in range(len(loop)))
+        
+    if new_faces:
+        report.fill_faces = len(new_faces)
+        faces = np.concatenate([faces, np.array(new_faces, dtype=faces.dtype)])
+    if new_vertices:
+        vertices = np.concatenate([vertices, np.array(new_vertices)])
+    return vertices, faces
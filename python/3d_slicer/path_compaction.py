@@ -0,0 +1,301 @@
+import math
+import numpy as np
+
+# Distance a simplified path may deviate from the sliced one, in mm
+SIMPLIFY_TOLERANCE = 0.01
+# Distance a fitted arc may deviate from the points and segments it replaces
+ARC_TOLERANCE = 0.01
+# Fewest polyline points that are replaced by an arc
+ARC_MIN_POINTS = 4
+# Arc lengths tested at once per start in every round of the search for the longest arc
+ARC_SEARCH_WAYS = 4
+# Flatter curves are left to the line simplification
+ARC_MAX_RADIUS = 1000.0
+# Cross products below this (relative to the segment lengths) count as collinear
+COLLINEAR_TOLERANCE = 1e-9
+
+def compact_paths(paths, tolerance=SIMPLIFY_TOLERANCE, arc_tolerance=ARC_TOLERANCE):
+    """Reduce the number of moves needed to print the paths
+    
+    Collinear and repeated points are merged first. Runs of points are then
+    replaced by circular arcs where an arc stays within arc_tolerance of
+    them, and the remaining straight runs of all paths are
+    simplified together with Douglas-Peucker at the given tolerance.
+    
+    Returns the compacted paths and, for each path, a (K, 3) array describing
+    the move ending at each point: arc center X, Y and direction, +1 for a
+    counterclockwise arc (G3), -1 for clockwise (G2) and 0 for a line.
+    """
+    merged = [merge_collinear(np.asarray(path, dtype=np.float64)[:, :2]) for path in paths]
+    if not merged:
+        return [], []
+        
+    counts = np.array([len(points) for points in merged])
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    points = np.concatenate(merged)
+    arcs = np.zeros((len(points), 3))
+    keep = np.ones(len(points), dtype=bool)
+    
+    # Arcs of all paths are fitted together, they never cross a path end
+    path_lasts = offsets[1:] - 1
+    spans = fit_arcs(points, arc_tolerance, np.repeat(path_lasts, counts)) if arc_tolerance else []
+    
+    # Straight runs between the arcs, in indices of the concatenated points
+    runs = []
+    path_index, run_start = 0, 0
+    for start, end, center, direction in spans:
+        while start > path_lasts[path_index]:
+            runs.append((run_start, path_lasts[path_index]))
+            path_index += 1
+            run_start = offsets[path_index]
+        keep[start + 1:end] = False
+        arcs[end] = (center[0], center[1], direction)
+        runs.append((run_start, start))
+        run_start = end
+    for path_index in range(path_index, len(merged)):
+        runs.append((max(run_start, offsets[path_index]), path_lasts[path_index]))
+        
+    if tolerance:
+        keep &= douglas_peucker(points, runs, tolerance)
+        
+    compacted, compacted_arcs = [], []
+    for path_index in range(len(merged)):
+        selection = slice(offsets[path_index], offsets[path_index + 1])
+        kept = keep[selection]
+        compacted.append(points[selection][kept])
+        compacted_arcs.append(arcs[selection][kept])
+    return compacted, compacted_arcs
+
+def merge_collinear(points):
+    """Drop repeated points and points lying on the line through their neighbours"""
+    if len(points) < 3:
+        return points
+        
+    deltas = np.diff(points, axis=0)
+    moving = np.concatenate([[True], (deltas != 0).any(axis=1)])
+    points = points[moving]
+    if len(points) < 3:
+        return points
+        
+    deltas = np.diff(points, axis=0)
+    cross = deltas[:-1, 0] * deltas[1:, 1] - deltas[:-1, 1] * deltas[1:, 0]
+    dot = (deltas[:-1] * deltas[1:]).sum(axis=1)
+    scale = np.hypot(deltas[:-1, 0], deltas[:-1, 1]) * np.hypot(deltas[1:, 0], deltas[1:, 1])
+    
+    # A point is only dropped when the path continues forward through it
+    straight = (np.abs(cross) <= COLLINEAR_TOLERANCE * scale) & (dot > 0)
+    return points[np.concatenate([[True], ~straight, [True]])]
+
+def douglas_peucker(points, runs, tolerance):
+    """Simplify many polylines at once, returning a mask of the points to keep
+    
+    runs are (first, last) index pairs into points, each one polyline. The
+    farthest interior point of every open segment is found in one vectorized
+    pass per level, and segments whose farthest point is off by more than the
+    tolerance are split there. Points outside the runs are kept.
+    """
+    keep = np.ones(len(points), dtype=bool)
+    runs = np.asarray(runs, dtype=np.int64).reshape(-1, 2)
+    starts, ends = runs[:, 0], runs[:, 1]
+    _, interior = _interior_indices(starts, ends)
+    keep[interior] = False
+    
+    while len(starts):
+        segment, index = _interior_indices(starts, ends)
+        if len(index) == 0:
+            break
+            
+        a, b, p = points[starts[segment]], points[ends[segment]], points[index]
+        chord = b - a
+        offset = p - a
+        length = np.hypot(chord[:, 0], chord[:, 1])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            distance = np.where(length > 0,
+                                np.abs(chord[:, 0] * offset[:, 1] - chord[:, 1] * offset[:, 0]) / length,
+                                np.hypot(offset[:, 0], offset[:, 1]))
+                                
+        # Farthest point of every segment, the interior points of a segment are contiguous
+        new_group = np.diff(segment, prepend=-1) != 0
+        group = np.cumsum(new_group) - 1
+        group_starts = np.flatnonzero(new_group)
+        largest = np.maximum.reduceat(distance, group_starts)
+        at_largest = np.flatnonzero(distance == largest[group])
+        farthest = index[at_largest[np.diff(group[at_largest], prepend=-1) != 0]]
+        split = largest > tolerance
+        owners = segment[group_starts][split]
+        
+        farthest = farthest[split]
+        keep[farthest] = True
+        starts = np.concatenate([starts[owners], farthest])
+        ends = np.concatenate([farthest, ends[owners]])
+    return keep
+
+def _interior_indices(starts, ends):
+    """Segment ids and point indices strictly between the segment ends"""
+    counts = np.maximum(ends - starts - 1, 0)
+    segment = np.repeat(np.arange(len(starts)), counts)
+    offsets = np.cumsum(counts) - counts
+    index = starts[segment] + 1 + np.arange(len(segment)) - offsets[segment]
+    return segment, index
+
+def fit_arcs(points, tolerance, path_lasts=None):
+    """Find runs of polylines that can be printed as circular arcs
+    
+    points may hold several polylines one after another, path_lasts then
+    gives for every point the index of the last point of its polyline. An
+    arc only spans points where the polyline keeps turning the same way, so
+    straight lines and zigzags are skipped without fitting anything. The
+    polylines are split where the turn direction flips and all pieces are
+    walked at once: the longest arc at the current start is searched for
+    between the shortest and the longest one possible, and the next arc
+    starts where it ends. Returns (start, end, center, direction) tuples of point indices in
+    ascending order.
+    """
+    count = len(points)
+    if count < ARC_MIN_POINTS:
+        return []
+    if path_lasts is None:
+        path_lasts = np.full(count, count - 1)
+        
+    # Turn direction at every point, 0 at the ends and where the point is
+    # within tolerance of the line through its neighbours, which covers
+    # straight runs and the jitter of points snapped to a grid
+    turning = np.zeros(count)
+    before, after = points[1:-1] - points[:-2], points[2:] - points[1:-1]
+    cross = before[:, 0] * after[:, 1] - before[:, 1] * after[:, 0]
+    chords = np.hypot(*(points[2:] - points[:-2]).T)
+    turning[1:-1] = np.where(np.abs(cross) > tolerance * chords, np.sign(cross), 0)
+    
+    # A turn against the one before ends every arc spanning both, the end
+    # reachable from every start is the first such point after its first turn
+    turns = np.flatnonzero(turning)
+    flipped = turning[turns[1:]] != turning[turns[:-1]]
+    flips, flip_previous = turns[1:][flipped], turns[:-1][flipped]
+    indices = np.arange(count)
+    following = np.searchsorted(flip_previous, indices + 1)
+    bend_ends = np.append(flips, count - 1)[following]
+    
+    # Starts whose shortest arc turns one way and stays inside the polyline
+    curved = (bend_ends >= indices + ARC_MIN_POINTS - 1) & (indices + ARC_MIN_POINTS - 1 <= path_lasts)
+    
+    # First curved start at or after every point, count where there is none
+    next_start = np.append(np.minimum.accumulate(np.where(curved, indices, count)[::-1])[::-1], count)
+    
+    # Pieces from every polyline start and turn flip to the next one
+    pieces = np.union1d(np.flatnonzero(np.diff(path_lasts, prepend=-1) != 0), flips)
+    starts = next_start[pieces]
+    lasts = np.minimum(path_lasts[pieces], np.append(pieces[1:], count - 1))
+    spans = []
+    while True:
+        active = starts + ARC_MIN_POINTS - 1 <= lasts
+        starts, lasts = starts[active], lasts[active]
+        if not len(starts):
+            break
+            
+        longest = np.minimum(bend_ends[starts], lasts)
+        ends, centers, directions = _longest_arcs(points, starts, starts + ARC_MIN_POINTS - 1, longest, tolerance)
+        fits = ends >= 0
+        arcs = np.flatnonzero(fits)
+        spans.extend(zip(starts[arcs].tolist(), ends[arcs].tolist(), centers[arcs], directions[arcs].tolist()))
+        
+        # The next arc starts where one ends, failed starts move on
+        starts = np.where(fits, ends, next_start[np.minimum(starts + 1, count)])
+        
+    spans.sort(key=lambda span: span[0])
+    return spans
+
+def _longest_arcs(points, starts, shortest, longest, tolerance):
+    """Longest arc from every start ending between shortest and longest, -1 where none fits
+    
+    A search with ARC_SEARCH_WAYS lengths per start in every round, the
+    longest one included, which settles most starts in one or two rounds.
+    Returns the arc ends, centers and directions.
+    """
+    ends = np.full(len(starts), -1)
+    centers = np.zeros((len(starts), 2))
+    directions = np.zeros(len(starts), dtype=np.int64)
+    
+    # Ends that fit lie above low, ends that do not at or above high
+    low, high = shortest - 1, longest + 1
+    ways = np.arange(1, ARC_SEARCH_WAYS + 1)
+    while True:
+        searching = np.flatnonzero(high - low > 1)
+        if not len(searching):
+            return ends, centers, directions
+        span = (high - low - 1)[searching, None]
+        candidates = low[searching, None] + (span * ways + ARC_SEARCH_WAYS - 1) // ARC_SEARCH_WAYS
+        new_centers, new_directions, fits = _fit_runs(points, np.repeat(starts[searching], ARC_SEARCH_WAYS),
+                                                      candidates.ravel(), tolerance)
+        fits = fits.reshape(candidates.shape)
+        
+        # The longest fitting length becomes the new low, the next failing one the new high
+        best = ARC_SEARCH_WAYS - 1 - np.argmax(fits[:, ::-1], axis=1)
+        found = fits.any(axis=1)
+        rows = np.arange(len(searching))
+        chosen = searching[found]
+        flat = (rows * ARC_SEARCH_WAYS + best)[found]
+        ends[chosen] = low[chosen] = candidates[rows, best][found]
+        centers[chosen] = new_centers[flat]
+        directions[chosen] = new_directions[flat]
+        
+        above = ~fits & (candidates > low[searching, None])
+        high[searching] = np.where(above.any(axis=1), candidates[rows, np.argmax(above, axis=1)], high[searching])
+
+def _fit_runs(points, starts, ends, tolerance):
+    """Fit arcs to the points starts..ends of every run, runs may differ in length"""
+    lengths = ends - starts + 1
+    offsets = np.minimum(np.arange(lengths.max()), (lengths - 1)[:, None])
+    return _fit_arc_batch(points[starts[:, None] + offsets], tolerance, lengths)
+
+def _fit_arc_batch(runs, tolerance, lengths=None):
+    """Fit circles through the first, middle and last point of (W, L, 2) runs
+    
+    A run fits when every point lies within tolerance of its circle, every
+    segment bulges less than tolerance away from it, and the points go round
+    the center one way by less than a full turn. Shorter runs are given by
+    lengths and padded with their last point. Returns the centers, the
+    directions (+1 counterclockwise, -1 clockwise) and a mask of the fits.
+    """
+    if lengths is None:
+        lengths = np.full(len(runs), runs.shape[1])
+    rows = np.arange(len(runs))
+    a, b, c = runs[:, 0], runs[rows, lengths // 2], runs[rows, lengths - 1]
+    determinant = 2 * (a[:, 0] * (b[:, 1] - c[:, 1]) + b[:, 0] * (c[:, 1] - a[:, 1]) + c[:, 0] * (a[:, 1] - b[:, 1]))
+    fits = np.abs(determinant) >= 1e-12
+    determinant = np.where(fits, determinant, 1.0)
+    
+    a2, b2, c2 = (a * a).sum(axis=1), (b * b).sum(axis=1), (c * c).sum(axis=1)
+    centers = np.stack([
+        (a2 * (b[:, 1] - c[:, 1]) + b2 * (c[:, 1] - a[:, 1]) + c2 * (a[:, 1] - b[:, 1])) / determinant,
+        (a2 * (c[:, 0] - b[:, 0]) + b2 * (a[:, 0] - c[:, 0]) + c2 * (b[:, 0] - a[:, 0])) / determinant
+    ], axis=1)
+    radius = np.hypot(a[:, 0] - centers[:, 0], a[:, 1] - centers[:, 1])
+    fits &= radius <= ARC_MAX_RADIUS
+    
+    spokes = runs - centers[:, None]
+    fits &= (np.abs(np.hypot(spokes[..., 0], spokes[..., 1]) - radius[:, None]) <= tolerance).all(axis=1)
+    middles = (spokes[:, :-1] + spokes[:, 1:]) / 2
+    fits &= (radius[:, None] - np.hypot(middles[..., 0], middles[..., 1]) <= tolerance).all(axis=1)
+    
+    cross = spokes[:, :-1, 0] * spokes[:, 1:, 1] - spokes[:, :-1, 1] * spokes[:, 1:, 0]
+    padding = np.arange(runs.shape[1] - 1) >= (lengths - 1)[:, None]
+    fits &= ((cross > 0) | padding).all(axis=1) | ((cross < 0) | padding).all(axis=1)
+    sweep = np.arctan2(cross, (spokes[:, :-1] * spokes[:, 1:]).sum(axis=2)).sum(axis=1)
+    fits &= np.abs(sweep) < 2 * math.pi - 1e-6
+    return centers, np.where(sweep > 0, 1, -1), fits
+
+def arc_lengths(starts, ends, arcs):
+    """Length of the moves from starts to ends, following arcs where given"""
+    deltas = ends - starts
+    lengths = np.hypot(deltas[:, 0], deltas[:, 1])
+    
+    curved = np.flatnonzero(arcs[:, 2] != 0)
+    if len(curved):
+        center = arcs[curved, :2]
+        direction = arcs[curved, 2]
+        u, v = starts[curved] - center, ends[curved] - center
+        angle = np.arctan2(u[:, 0] * v[:, 1] - u[:, 1] * v[:, 0], (u * v).sum(axis=1))
+        # Sweep in the direction of the arc, which may go beyond half a turn
+        sweep = np.where(angle * direction > 0, angle, angle + direction * 2 * math.pi)
+        lengths[curved] = np.abs(sweep) * np.hypot(u[:, 0], u[:, 1])
+    return lengths
@@ -0,0 +1,197 @@
+import math
+import numpy as np
+
+# 2-opt compares every path with this many following paths of the order
+TWO_OPT_WINDOW = 64
+TWO_OPT_PASSES = 8
+
+class EndpointGrid:
+    """Uniform grid over path entry points for nearest point queries
+    
+    Points of a path are stored contiguously (offsets[p]:offsets[p + 1]), so a
+    whole path is removed by clearing a slice of the alive mask. Cells drop
+    dead points lazily when they are visited.
+    """
+    def __init__(self, points, offsets):
+        self.points = points
+        self.offsets = offsets
+        self.alive = np.ones(len(points), dtype=bool)
+        
+        # About one point per cell
+        self.origin = points.min(axis=0)
+        extent = float((points.max(axis=0) - self.origin).max())
+        self.cell_size = max(extent / max(math.sqrt(len(points)), 1.0), 1e-9)
+        
+        cells = np.floor((points - self.origin) / self.cell_size).astype(np.int64)
+        self.span = cells.max(axis=0)
+        self.cells = {}
+        for index, key in enumerate(map(tuple, cells.tolist())):
+            self.cells.setdefault(key, []).append(index)
+            
+    def remove_path(self, path):
+        self.alive[self.offsets[path]:self.offsets[path + 1]] = False
+        
+    def nearest(self, point):
+        """Return the index of the alive point closest to point, or None"""
+        cx, cy = np.floor((np.asarray(point) - self.origin) / self.cell_size).astype(np.int64).tolist()
+        max_radius = max(abs(cx), abs(cy), abs(self.span[0] - cx), abs(self.span[1] - cy)) + 1
+        best, best_distance = None, math.inf
+        
+        for radius in range(max_radius + 1):
+            candidates = []
+            for key in self._ring_cells(cx, cy, radius):
+                indices = self.cells.get(key)
+                if not indices:
+                    continue
+                indices = [index for index in indices if self.alive[index]]
+                if indices:
+                    self.cells[key] = indices
+                    candidates.extend(indices)
+                else:
+                    del self.cells[key]
+                    
+            if candidates:
+                deltas = self.points[candidates] - point
+                distances = np.hypot(deltas[:, 0], deltas[:, 1])
+                closest = int(distances.argmin())
+                if distances[closest] < best_distance:
+                    best, best_distance = candidates[closest], distances[closest]
+                    
+            # Points in cells further out are at least this far away
+            if best is not None and best_distance <= radius * self.cell_size:
+                break
+        return best
+        
+    def _ring_cells(self, cx, cy, radius):
+        """Cells at Chebyshev distance radius from (cx, cy)"""
+        if radius == 0:
+            yield (cx, cy)
+            return
+        for x in range(cx - radius, cx + radius + 1):
+            yield (x, cy - radius)
+            yield (x, cy + radius)
+        for y in range(cy - radius + 1, cy + radius):
+            yield (cx - radius, y)
+            yield (cx + radius, y)
+
+def travel_distance(paths, start=(0.0, 0.0)):
+    """Total length of the travel moves from start into and between the paths"""
+    if not paths:
+        return 0.0
+        
+    entries = np.array([path[0][:2] for path in paths], dtype=np.float64)
+    exits = np.array([path[-1][:2] for path in paths], dtype=np.float64)
+    previous = np.concatenate([[np.asarray(start, dtype=np.float64)[:2]], exits[:-1]])
+    deltas = entries - previous
+    return float(np.hypot(deltas[:, 0], deltas[:, 1]).sum())
+
+def order_paths(paths, start=(0.0, 0.0), closed=False):
+    """Order polylines to shorten the travel between them
+    
+    A nearest-neighbour tour over the entry points picks the next path; open
+    paths may be entered from either end, closed rings from any vertex (the
+    ring is rotated to start there and keeps its winding). The tour is then
+    refined with windowed 2-opt moves. Returns the ordered paths as arrays.
+    """
+    paths = [np.asarray(path, dtype=np.float64) for path in paths]
+    if not paths:
+        return []
+        
+    # Candidate entry points: both ends of open paths, every vertex of rings
+    if closed:
+        entry_points = [path[:-1, :2] if _is_closed(path) else path[:, :2] for path in paths]
+    else:
+        entry_points = [path[[0, -1], :2] for path in paths]
+    counts = np.array([len(points) for points in entry_points])
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    grid = EndpointGrid(np.concatenate(entry_points), offsets)
+    owners = np.repeat(np.arange(len(paths)), counts)
+    
+    ordered = []
+    position = np.asarray(start, dtype=np.float64)[:2]
+    for _ in range(len(paths)):
+        index = grid.nearest(position)
+        path_index = owners[index]
+        vertex = index - offsets[path_index]
+        grid.remove_path(path_index)
+        
+        path = paths[path_index]
+        if closed:
+            path = _rotate_ring(path, vertex)
+        elif vertex == 1:
+            path = path[::-1]
+        ordered.append(path)
+        position = path[-1, :2]
+        
+    return _two_opt(ordered, np.asarray(start, dtype=np.float64)[:2], closed)
+
+def _is_closed(path):
+    return len(path) > 2 and np.array_equal(path[0], path[-1])
+
+def _rotate_ring(path, vertex):
+    """Start a ring at the given vertex, keeping it closed and its direction"""
+    if not _is_closed(path):
+        return np.roll(path, -vertex, axis=0)
+    ring = np.roll(path[:-1], -vertex, axis=0)
+    return np.concatenate([ring, ring[:1]])
+
+def _distance(a, b):
+    delta = a - b
+    return np.hypot(delta[..., 0], delta[..., 1])
+
+def _two_opt(paths, start, closed):
+    """Reverse runs of the path order while that shortens the travel
+    
+    Reversing positions i..j replaces the travel into i and out of j; open
+    paths in the run are flipped, rings start and end at the same point and
+    stay as they are. All moves of a pass are evaluated at once and the
+    improving ones that touch disjoint parts of the order are applied.
+    """
+    count = len(paths)
+    if count < 2:
+        return paths
+        
+    order = np.arange(count)
+    flipped = np.zeros(count, dtype=bool)
+    entries = np.array([path[0, :2] for path in paths])
+    exits = np.array([path[-1, :2] for path in paths])
+    
+    i = np.arange(count)[:, None]
+    j = i + np.arange(min(TWO_OPT_WINDOW, count))[None, :]
+    valid = j < count
+    j = np.minimum(j, count - 1)
+    last = j == count - 1
+    
+    for _ in range(TWO_OPT_PASSES):
+        previous = np.concatenate([[start], exits[:-1]])
+        following = np.concatenate([entries[1:], entries[-1:]])
+        
+        # Travel after the run is free when it ends the layer
+        into = _distance(previous, entries)
+        out_of = np.where(np.arange(count) == count - 1, 0.0, _distance(exits, following))
+        gain = (into[i] + out_of[j] - _distance(previous[i], exits[j])
+                - np.where(last, 0.0, _distance(entries[i], following[j])))
+        gain = np.where(valid, gain, 0.0)
+        
+        # Best move starting at every position, applied best first
+        columns = gain.argmax(axis=1)
+        best = gain[np.arange(count), columns]
+        rows = np.flatnonzero(best > 1e-9)
+        if len(rows) == 0:
+            break
+            
+        occupied = np.zeros(count + 1, dtype=bool)
+        for row in rows[np.argsort(-best[rows])].tolist():
+            first, end = row, int(j[row, columns[row]])
+            if occupied[max(first - 1, 0):end + 2].any():
+                continue
+            occupied[first:end + 1] = True
+            
+            run = slice(first, end + 1)
+            order[run] = order[run][::-1].copy()
+            flipped[run] = ~flipped[run][::-1]
+            entries[run], exits[run] = exits[run][::-1].copy(), entries[run][::-1].copy()
+            
+    # Rings need no flip, their entry and exit are the same point
+    return [paths[index][::-1] if flip and not closed else paths[index]
+            for index, flip in zip(order.tolist(), flipped.tolist())]
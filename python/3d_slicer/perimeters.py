@@ -0,0 +1,48 @@
+import numpy as np
+import shapely
+from shapely.geometry.polygon import orient
+
+# Wall shells printed inside every contour
+DEFAULT_PERIMETER_COUNT = 2
+
+# Offsets run on coordinates snapped to this grid in mm, i.e. on integer
+# multiples of it, which keeps them free of slivers and near-touching rings
+OFFSET_GRID_SIZE = 1e-4
+
+# Sharp corners are mitred up to this many offset distances, and cut off beyond
+OFFSET_MITRE_LIMIT = 2.0
+
+def generate_shells(polygons, count, extrusion_width):
+    """Return the shell polygons of a layer and the region left for infill
+    
+    Shell i is the centre line of the i-th wall, the contours offset inwards
+    by (i + 0.5) extrusion widths, so the outer wall's edge lies on the
+    model surface. The infill region is the inner edge of the innermost
+    wall, count widths in. All offsets of all contours of the layer are one
+    broadcast shapely.buffer call on the contours snapped to
+    OFFSET_GRID_SIZE, and the results are snapped again. Shells are returned
+    outermost first as a flat list of polygons; contours thinner than a
+    shell lose it.
+    """
+    if not polygons:
+        return [], []
+        
+    contours = shapely.set_precision(polygons, OFFSET_GRID_SIZE)
+    distances = -extrusion_width * np.append(np.arange(count) + 0.5, count)
+    offsets = shapely.buffer(contours[None, :], distances[:, None], join_style='mitre',
+                             mitre_limit=OFFSET_MITRE_LIMIT)
+    offsets = shapely.set_precision(offsets, OFFSET_GRID_SIZE)
+    
+    # Leave the coordinates on the grid but drop the precision model snapping
+    # set on them, which pickling loses, so later overlays and offsets behave
+    # the same in pool workers and in the main process
+    offsets = shapely.set_precision(offsets, 0.0)
+    
+    shells = [polygon for row in offsets[:count] for polygon in polygon_parts(row)]
+    return shells, polygon_parts(offsets[count])
+
+def polygon_parts(geometries):
+    """The non-empty polygons of geometries, split up and wound like the contours"""
+    parts = shapely.get_parts(geometries)
+    keep = (shapely.get_type_id(parts) == shapely.GeometryType.POLYGON) & ~shapely.is_empty(parts)
+    return [orient(polygon, sign=1.0) for polygon in parts[keep]]
@@ -0,0 +1,169 @@
+from gcode_encoders import encoder_for_path
+from gcode_generator import GCodeGenerator
+from mesh_repair import repair_mesh
+from slicer_engine import SlicerEngine
+from stl_loader import STLLoader
+
+# Settings used when a headless run does not give them
+DEFAULT_SETTINGS = {
+    'layer_height': 0.2,
+    'infill_density': 0.2,
+    'infill_pattern': 'lines',
+    'print_speed': 50.0,
+    'nozzle_temp': 200,
+    'bed_temp': 60
+}
+
+# Pipeline stages in order, each one works on the results of the one before.
+# The wall shells are built with the infill, both only need the contours
+STAGES = ('contours', 'infill', 'gcode')
+
+# First stage that reads a setting, settings not listed only change the G-code
+SETTING_STAGES = {
+    'layer_height': 'contours',
+    'adaptive_layers': 'contours',
+    'min_layer_height': 'contours',
+    'max_layer_height': 'contours',
+    'infill_density': 'infill',
+    'infill_pattern': 'infill',
+    'extrusion_width': 'infill',
+    'perimeter_count': 'infill',
+    'skin_layers': 'infill'
+}
+
+def changed_stage(old, new):
+    """Earliest stage reading a setting that differs between old and new, None if none does"""
+    stages = [SETTING_STAGES.get(name, 'gcode') for name in set(old) | set(new)
+              if old.get(name) != new.get(name)]
+    return min(stages, key=STAGES.index) if stages else None
+
+def slice_mesh(mesh, settings, cache=None, progress_callback=None, workers=None, slicer=None):
+    """Slice a mesh at settings['layer_height'], reusing layers from the SliceCache if given"""
+    key, layers = _cache_lookup(cache, mesh, settings, progress_callback)
+    if layers is not None:
+        return layers
+        
+    slicer = slicer or SlicerEngine()
+    layers = slicer.slice(mesh, settings['layer_height'], progress_callback=progress_callback,
+                          workers=workers, settings=settings)
+    if cache is not None:
+        cache.put(key, layers)
+    return layers
+
+def fill_layers(mesh, layers, settings, cache=None, progress_callback=None, slicer=None):
+    """Regenerate the infill of layers sliced from mesh, keeping their perimeters"""
+    key, filled = _cache_lookup(cache, mesh, settings, progress_callback)
+    if filled is not None:
+        return filled
+        
+    slicer = slicer or SlicerEngine()
+    filled = slicer.fill_layers(layers, progress_callback=progress_callback, settings=settings)
+    if cache is not None:
+        cache.put(key, filled)
+    return filled
+
+def _cache_lookup(cache, mesh, settings, progress_callback):
+    """Return the cache key and the cached layers, or None for both without a cache"""
+    if cache is None:
+        return None, None
+        
+    key = cache.key(mesh, settings['layer_height'], settings)
+    layers = cache.get(key)
+    if layers is not None and progress_callback:
+        progress_callback(100)
+    return key, layers
+
+def write_gcode(layers, settings, path, progress_callback=None, workers=None, generator=None):
+    """Write the G-code of the layers to path, encoded by its extension (.gz, .gcdb)"""
+    generator = generator or GCodeGenerator()
+    with open(path, 'wb') as f:
+        encoder = encoder_for_path(path, f)
+        if encoder is None:
+            return generator.generate_to(f, layers, settings, progress_callback, workers=workers)
+        with encoder:
+            return generator.generate_to(encoder, layers, settings, progress_callback, workers=workers)
+
+def load_mesh(stl_path, repair=True):
+    """Load an STL file, returns the mesh and the RepairReport, None when not repaired"""
+    mesh = STLLoader().load(stl_path)
+    if not repair:
+        return mesh, None
+    return repair_mesh(mesh)
+
+def run(stl_path, gcode_path, settings=None, cache=None, workers=None, repair=True):
+    """Load, repair, slice and write G-code without the GUI, returns the G-code counters
+    
+    Without a cache nothing needs the whole list of layers, so they are
+    written out as they are sliced and memory stays bounded.
+    """
+    settings = dict(DEFAULT_SETTINGS, **(settings or {}))
+    mesh, report = load_mesh(stl_path, repair)
+    if report is not None and report.changed:
+        print("Repaired mesh: {}".format(report))
+    if cache is None:
+        layers = SlicerEngine().iter_layers(mesh, settings['layer_height'], workers=workers, settings=settings)
+    else:
+        layers = slice_mesh(mesh, settings, cache, workers=workers)
+    return write_gcode(layers, settings, gcode_path, workers=workers)
+
+class SlicePipeline:
+    """Slice a mesh and generate its G-code, rerunning only the stages a change needs
+    
+    The settings of the last run of every stage are kept. A new layer height
+    cuts the mesh again, new infill settings regenerate the infill of the
+    kept perimeters, and printer settings such as speed or temperatures
+    only need new G-code.
+    """
+    def __init__(self, mesh=None, cache=None, slicer=None, generator=None, workers=None):
+        self.cache = cache
+        self.slicer = slicer or SlicerEngine()
+        self.generator = generator or GCodeGenerator()
+        self.workers = workers
+        self.set_mesh(mesh)
+        
+    def set_mesh(self, mesh):
+        """Start over with a new mesh"""
+        self.mesh = mesh
+        self.layers = None
+        self.stage_settings = {}  # Stage name -> settings of its last run
+        
+    def stale_stage(self, settings):
+        """First stage whose results are out of date for settings, None if all are current"""
+        for stage in STAGES:
+            previous = self.stage_settings.get(stage)
+            if previous is None:
+                return stage
+            changed = changed_stage(previous, settings)
+            if changed is not None and STAGES.index(changed) <= STAGES.index(stage):
+                return stage
+        return None
+        
+    def slice(self, settings, progress_callback=None):
+        """Return the layers for settings and the first stage that ran, None if none had to"""
+        stage = self.stale_stage(settings)
+        if stage == 'contours':
+            self.layers = slice_mesh(self.mesh, settings, self.cache, progress_callback,
+                                     self.workers, self.slicer)
+        elif stage == 'infill':
+            self.layers = fill_layers(self.mesh, self.layers, settings, self.cache,
+                                      progress_callback, self.slicer)
+        else:
+            if progress_callback:
+                progress_callback(100)
+            return self.layers, None
+            
+        self.stage_settings = {'contours': dict(settings), 'infill': dict(settings)}
+        return self.layers, stage
+        
+    def generate_to(self, stream, settings, progress_callback=None, slice_progress_callback=None):
+        """Write the G-code for settings to stream, slicing again first if needed
+        
+        slice_progress_callback reports the progress of that slicing, which
+        may take longer than the G-code itself, e.g. when only a decimated
+        preview was sliced so far.
+        """
+        self.slice(settings, slice_progress_callback)
+        counters = self.generator.generate_to(stream, self.layers, settings, progress_callback,
+                                              workers=self.workers)
+        self.stage_settings['gcode'] = dict(settings)
+        return counters
@@ -0,0 +1,67 @@
+import math
+import numpy as np
+
+# Printer and filament defaults, overridden by the settings of the same name
+DEFAULT_ACCELERATION = 1500.0   # mm/s^2
+DEFAULT_JERK = 10.0             # mm/s, largest instant change of velocity
+DEFAULT_FILAMENT_DIAMETER = 1.75  # mm
+DEFAULT_FILAMENT_DENSITY = 1.24   # g/cm^3 (PLA)
+
+def move_times(lengths, directions, speed, acceleration=DEFAULT_ACCELERATION, jerk=DEFAULT_JERK):
+    """Time of every move of a chain that starts and ends at rest
+    
+    Moves follow a trapezoid profile: accelerate, cruise at speed, decelerate.
+    The speed at the junction of two moves is limited so the velocity jumps
+    by at most jerk. The forward and backward passes of the planner are
+    prefix minima over the cumulative length, so all moves are planned in a
+    few array operations:
+    
+        v[k]^2 <= min over j <= k of (cap[j]^2 + 2a (s[k] - s[j]))
+        
+    and likewise backwards. directions are the (N, D) unit move directions.
+    """
+    lengths = np.asarray(lengths, dtype=np.float64)
+    if len(lengths) == 0:
+        return np.zeros(0)
+        
+    # Junction k lies before move k, velocity jumps up to jerk are instant
+    caps = np.full(len(lengths) + 1, min(speed, jerk), dtype=np.float64)
+    change = np.linalg.norm(directions[1:] - directions[:-1], axis=1)
+    with np.errstate(divide='ignore'):
+        caps[1:-1] = np.minimum(speed, jerk / change)
+        
+    squared = caps * caps
+    reach = 2 * acceleration * np.concatenate([[0.0], np.cumsum(lengths)])
+    forward = np.minimum.accumulate(squared - reach) + reach
+    backward = np.minimum.accumulate((squared + reach)[::-1])[::-1] - reach
+    velocity = np.sqrt(np.maximum(np.minimum(squared, np.minimum(forward, backward)), 0.0))
+    
+    entry, exit = velocity[:-1], velocity[1:]
+    peak = np.sqrt(np.minimum(acceleration * lengths + (entry * entry + exit * exit) / 2, speed * speed))
+    ramp_length = (2 * peak * peak - entry * entry - exit * exit) / (2 * acceleration)
+    return (2 * peak - entry - exit) / acceleration + np.maximum(lengths - ramp_length, 0.0) / speed
+
+def path_time(points, lengths, speed, acceleration=DEFAULT_ACCELERATION, jerk=DEFAULT_JERK):
+    """Time to follow moves ending at points with the given (arc) lengths, from rest to rest
+    
+    Junction directions use the chords of the moves. Moves of zero length are
+    skipped.
+    """
+    moving = lengths > 0
+    if not moving.any():
+        return 0.0
+        
+    deltas = np.diff(points, axis=0, prepend=points[:1])[moving]
+    chords = np.hypot(deltas[:, 0], deltas[:, 1])
+    directions = deltas / np.where(chords > 0, chords, 1.0)[:, None]
+    return float(move_times(lengths[moving], directions, speed, acceleration, jerk).sum())
+
+def filament_mass(length, diameter=DEFAULT_FILAMENT_DIAMETER, density=DEFAULT_FILAMENT_DENSITY):
+    """Mass in grams of a length of filament in mm"""
+    return length * math.pi * (diameter / 2) ** 2 * density / 1000.0
+
+def format_duration(seconds):
+    """Format seconds as e.g. '2h 05m 07s'"""
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return '{}h {:02d}m {:02d}s'.format(hours, minutes, seconds)
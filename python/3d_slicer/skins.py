@@ -0,0 +1,64 @@
+import numpy as np
+import shapely
+from collections import deque
+from functools import reduce
+from perimeters import OFFSET_GRID_SIZE, polygon_parts
+
+# Solid layers below every top surface and above every bottom surface
+DEFAULT_SKIN_LAYERS = 3
+
+# Pattern of the solid fill, diagonal lines turning by 90 degrees per layer
+SKIN_PATTERN = 'rectilinear'
+
+def iter_skin_regions(layers, skin_layers, min_width=0.0):
+    """Yield (layer, solid, sparse) for layers, splitting each infill region in two
+    
+    solid is the part of the infill region not covered by the contours of
+    all skin_layers layers above and below, i.e. close to a top or bottom
+    surface; sparse is the rest. Both are lists of polygons. Solid areas
+    narrower than min_width are left to the sparse infill.
+    
+    The contour area of each layer is unioned once when the layer enters a
+    sliding window of 2 * skin_layers + 1 layers and then reused for every
+    neighbour, a layer is finished as soon as the layers above it arrive.
+    The areas are prepared, so neighbours covering the whole region, which
+    is most of them away from the surfaces, cost a predicate test instead
+    of an overlay. Overlays run on the OFFSET_GRID_SIZE grid of the shells.
+    """
+    if skin_layers <= 0:
+        for layer in layers:
+            yield layer, [], list(layer.perimeters if layer.infill_region is None else layer.infill_region)
+        return
+        
+    below = deque(maxlen=skin_layers)
+    ahead = deque()  # (layer, contour area) of the layers not finished yet
+    
+    def finish():
+        layer, area = ahead.popleft()
+        region = shapely.union_all(layer.perimeters if layer.infill_region is None else layer.infill_region,
+                                   grid_size=OFFSET_GRID_SIZE)
+        neighbours = np.array(list(below) + [neighbour for _, neighbour in ahead], dtype=object)
+        below.append(area)
+        
+        # Layers missing above the top or below the bottom cover nothing
+        if len(neighbours) < 2 * skin_layers:
+            return layer, polygon_parts(region), []
+        neighbours = neighbours[~shapely.covers(neighbours, region)]
+        if not len(neighbours):
+            return layer, [], polygon_parts(region)
+        covered = reduce(lambda a, b: shapely.intersection(a, b, grid_size=OFFSET_GRID_SIZE), neighbours)
+        solid = shapely.difference(region, covered, grid_size=OFFSET_GRID_SIZE)
+        if min_width > 0:
+            solid = shapely.buffer(shapely.buffer(solid, -min_width / 2, join_style='mitre'),
+                                   min_width / 2, join_style='mitre')
+            solid = shapely.intersection(solid, region, grid_size=OFFSET_GRID_SIZE)
+        return layer, polygon_parts(solid), polygon_parts(shapely.difference(region, solid, grid_size=OFFSET_GRID_SIZE))
+        
+    for layer in layers:
+        area = shapely.union_all(layer.perimeters, grid_size=OFFSET_GRID_SIZE)
+        shapely.prepare(area)
+        ahead.append((layer, area))
+        if len(ahead) > skin_layers:
+            yield finish()
+    while ahead:
+        yield finish()
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import math
+import os
+import tempfile
+import zipfile
+import zlib
+import numpy as np
+import shapely
+from slicer_engine import DEFAULT_SLICE_SETTINGS, Layer
+
+# Bump when the stored layout or the slicing results change
+CACHE_FORMAT_VERSION = 4
+DEFAULT_CACHE_SIZE = 512 * 1024 * 1024
+DEFAULT_CACHE_DIR = os.environ.get('SLICER_CACHE_DIR',
+                                   os.path.join(os.path.expanduser('~'), '.cache', '3d_slicer'))
+
+# Raised by np.load and unpacking for truncated or otherwise damaged entries
+CACHE_READ_ERRORS = (OSError, EOFError, KeyError, ValueError, zipfile.BadZipFile, zlib.error)
+
+class SliceCache:
+    """Content addressed on-disk cache of sliced layers
+    
+    Entries are keyed by a hash of the mesh triangle bytes and the slicing
+    parameters and stored as one .npz file each, with the ragged polygon and
+    infill data flattened into coordinate and offset arrays. The directory
+    is kept below max_bytes by evicting the least recently used entries; a
+    cache hit refreshes the modification time that is used as the LRU order.
+    """
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_SIZE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        
+    def key(self, mesh, layer_height, settings=None):
+        """Hash of the triangles and of every parameter that changes the layers"""
+        triangles = np.ascontiguousarray(mesh.triangles)
+        parameters = dict(DEFAULT_SLICE_SETTINGS)
+        parameters.update({name: value for name, value in (settings or {}).items() if name in DEFAULT_SLICE_SETTINGS})
+        parameters['layer_height'] = layer_height
+        
+        digest = hashlib.sha256()
+        digest.update(json.dumps([CACHE_FORMAT_VERSION, str(triangles.dtype), triangles.shape,
+                                  parameters], sort_keys=True).encode('utf-8'))
+        digest.update(memoryview(triangles).cast('B'))
+        return digest.hexdigest()
+        
+    def path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+        
+    def get(self, key):
+        """Return the cached layers, or None on a miss"""
+        path = self.path(key)
+        try:
+            with np.load(path) as data:
+                layers = unpack_layers(data)
+        except FileNotFoundError:
+            return None
+        except CACHE_READ_ERRORS:
+            # Damaged, e.g. by an interrupted write of an older version, it
+            # is removed so the next put stores a good entry
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+            
+        os.utime(path)
+        return layers
+        
+    def put(self, key, layers):
+        """Store layers under key and evict old entries beyond the size limit"""
+        # Written to a temporary file first so readers never see a partial entry
+        descriptor, temporary = tempfile.mkstemp(suffix='.npz.tmp', dir=self.directory)
+        try:
+            with os.fdopen(descriptor, 'wb') as f:
+                np.savez_compressed(f, **pack_layers(layers))
+            os.replace(temporary, self.path(key))
+        except BaseException:
+            os.remove(temporary)
+            raise
+        self.evict()
+        
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz'):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+                
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+            
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz'):
+                os.remove(os.path.join(self.directory, name))
+
+def pack_layers(layers):
+    """Flatten layers into arrays: coordinates plus offsets for every ragged level"""
+    arrays = {
+        'z_heights': np.array([layer.z_height for layer in layers], dtype=np.float64),
+        'thicknesses': np.array([np.nan if layer.thickness is None else layer.thickness for layer in layers],
+                                dtype=np.float64)
+    }
+    arrays.update(_pack_lines('line', [layer.infill_lines for layer in layers]))
+    arrays.update(_pack_lines('skin_line', [layer.skin_lines for layer in layers]))
+    arrays.update(_pack_polygons('polygon', [layer.perimeters for layer in layers]))
+    arrays.update(_pack_polygons('shell', [layer.shells or [] for layer in layers]))
+    arrays.update(_pack_polygons('region', [layer.infill_region or [] for layer in layers]))
+    return arrays
+
+def unpack_layers(data):
+    """Rebuild the layers from the arrays written by pack_layers"""
+    perimeters = _unpack_polygons(data, 'polygon')
+    shells = _unpack_polygons(data, 'shell')
+    regions = _unpack_polygons(data, 'region')
+    infill_lines = _unpack_lines(data, 'line')
+    skin_lines = _unpack_lines(data, 'skin_line')
+    thicknesses = [None if math.isnan(thickness) else thickness for thickness in data['thicknesses'].tolist()]
+    
+    return [Layer(z, perimeters[i], infill_lines[i], thicknesses[i], shells[i], regions[i], skin_lines[i])
+            for i, z in enumerate(data['z_heights'].tolist())]
+
+def _pack_lines(name, layer_lines):
+    """Arrays named after name holding lists of polylines, one list per layer"""
+    lines = [np.asarray(line, dtype=np.float64).reshape(-1, 2) for layer in layer_lines for line in layer]
+    return {
+        name + '_coords': np.concatenate(lines) if lines else np.empty((0, 2)),
+        name + '_offsets': _offsets([len(line) for line in lines]),
+        name + '_layer_offsets': _offsets([len(layer) for layer in layer_lines])
+    }
+
+def _unpack_lines(data, name):
+    offsets = data[name + '_offsets']
+    lines = np.split(data[name + '_coords'], offsets[1:-1]) if len(offsets) > 1 else []
+    layer_offsets = data[name + '_layer_offsets']
+    return [[line.tolist() for line in lines[layer_offsets[i]:layer_offsets[i + 1]]]
+            for i in range(len(layer_offsets) - 1)]
+
+def _pack_polygons(name, layer_polygons):
+    """Arrays named after name holding lists of polygons, one list per layer"""
+    polygons = [polygon for layer in layer_polygons for polygon in layer]
+    if polygons:
+        _, coords, (ring_offsets, polygon_offsets) = shapely.to_ragged_array(polygons)
+    else:
+        coords = np.empty((0, 2))
+        ring_offsets = polygon_offsets = np.zeros(1, dtype=np.int64)
+        
+    return {
+        name + '_coords': coords,
+        name + '_ring_offsets': ring_offsets,
+        name + '_polygon_offsets': polygon_offsets,
+        name + '_layer_offsets': _offsets([len(layer) for layer in layer_polygons])
+    }
+
+def _unpack_polygons(data, name):
+    layer_offsets = data[name + '_layer_offsets']
+    polygons = []
+    if layer_offsets[-1]:
+        polygons = shapely.from_ragged_array(shapely.GeometryType.POLYGON, data[name + '_coords'],
+                                             (data[name + '_ring_offsets'], data[name + '_polygon_offsets'])).tolist()
+    return [polygons[layer_offsets[i]:layer_offsets[i + 1]] for i in range(len(layer_offsets) - 1)]
+
+def _offsets(counts):
+    return np.concatenate([[0], np.cumsum(counts, dtype=np.int64)]).astype(np.int64)
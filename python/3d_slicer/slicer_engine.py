@@ -1,194 +1,447 @@
 import numpy as np
-from shapely.geometry import Polygon, LineString, Point
-from shapely.ops import unary_union, polygonize
+from shapely.geometry import Polygon
+from shapely.geometry.polygon import orient
+from mesh import grid_keys
+from infill import line_spacing, generate_infill
+from perimeters import DEFAULT_PERIMETER_COUNT, generate_shells
+from skins import DEFAULT_SKIN_LAYERS, SKIN_PATTERN, iter_skin_regions
+from layer_heights import DEFAULT_MAX_LAYER_HEIGHT, DEFAULT_MIN_LAYER_HEIGHT, adaptive_layer_heights, uniform_layer_heights
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
 import math
+import sys
 
 class Layer:
-    def __init__(self, z_height, perimeters=None, infill_lines=None):
+    def __init__(self, z_height, perimeters=None, infill_lines=None, thickness=None, shells=None, infill_region=None,
+                 skin_lines=None):
         self.z_height = z_height
-        self.perimeters = perimeters or []
+        self.thickness = thickness  # Layer height in mm, None if not known
+        self.perimeters = perimeters or []  # Contours cut from the mesh
         self.infill_lines = infill_lines or []
+        self.shells = shells  # Wall centre lines to print, None prints the contours
+        self.infill_region = infill_region  # Area inside the walls, None for the contours
+        self.skin_lines = skin_lines or []  # Solid fill near top and bottom surfaces
+
+# Cut points closer than this (in mm) are treated as the same contour vertex
+CONTOUR_TOLERANCE = 1e-6
+
+# Number of layers cut together by one call of the batched intersection kernel
+LAYER_BATCH_SIZE = 32
+
+class TriangleZIndex:
+    """Triangles sorted by their Z range for sweeping a plane upwards through the mesh"""
+    def __init__(self, z_extent):
+        self.z_min = z_extent[:, 0]
+        self.z_max = z_extent[:, 1]
+        self.order = np.argsort(self.z_min, kind='stable')
+        self.sorted_z_min = self.z_min[self.order]
+        
+    def sweep(self, ranges):
+        """Yield the indices of triangles overlapping each ascending (low, high) Z range
+        
+        Triangles enter the active set once the sweep reaches their lowest vertex
+        and leave it once it has passed their highest one, so every range only
+        looks at the triangles around it.
+        """
+        active = np.empty(0, dtype=np.int64)
+        start = 0
+        
+        for low, high in ranges:
+            end = np.searchsorted(self.sorted_z_min, high, side='right')
+            if end > start:
+                active = np.concatenate([active, self.order[start:end]])
+                start = end
+            active = active[self.z_max[active] >= low]
+            yield active
+
+def slice_triangles(triangles, heights):
+    """Cut triangles with horizontal planes at all given heights at once
+    
+    Returns (segments, layer_ids): an (M, 2, 2) array of XY segment endpoints
+    and the index into heights each segment belongs to. A vertex lying exactly
+    on a plane counts as below it, so a triangle is cut by plane z when
+    z_min <= z < z_max. This always gives two crossing edges, horizontal faces
+    are never cut and neighbouring triangles agree on shared vertices.
+    
+    Endpoints are interpolated from the lower to the upper vertex of each edge,
+    so both triangles sharing an edge produce bit-identical points. Segments run
+    with the solid on their left for outward wound triangles, which makes outer
+    contours counter-clockwise and holes clockwise.
+    """
+    triangles = np.asarray(triangles, dtype=np.float64)
+    heights = np.asarray(heights, dtype=np.float64)
+    z = triangles[:, :, 2]
+    
+    # Every (triangle, layer) pair where the plane crosses the triangle
+    first = np.searchsorted(heights, z.min(axis=1), side='left')
+    last = np.searchsorted(heights, z.max(axis=1), side='left')
+    counts = np.maximum(last - first, 0)
+    triangle_ids = np.repeat(np.arange(len(triangles)), counts)
+    offsets = np.cumsum(counts) - counts
+    layer_ids = first[triangle_ids] + np.arange(len(triangle_ids)) - offsets[triangle_ids]
+    
+    cut = triangles[triangle_ids]
+    plane = heights[layer_ids]
+    above = cut[:, :, 2] > plane[:, None]
+    above_next = np.roll(above, -1, axis=1)
+    
+    # Edge k runs from vertex k to vertex k + 1. The segment starts where the
+    # winding goes down through the plane and ends where it comes back up
+    start_edge = np.argmax(above & ~above_next, axis=1)
+    end_edge = np.argmax(~above & above_next, axis=1)
+    
+    segments = np.stack([
+        _edge_plane_points(cut, start_edge, plane),
+        _edge_plane_points(cut, end_edge, plane)
+    ], axis=1)
+    
+    # Triangles touching the plane with a single vertex give zero length segments
+    keep = np.any(segments[:, 0] != segments[:, 1], axis=1)
+    return segments[keep], layer_ids[keep]
+
+def _edge_plane_points(triangles, edges, plane):
+    """XY points where the given edge of every triangle crosses its plane"""
+    rows = np.arange(len(triangles))
+    a = triangles[rows, edges]
+    b = triangles[rows, (edges + 1) % 3]
+    
+    # Interpolate from the lower vertex so shared edges give identical results
+    swap = a[:, 2] > b[:, 2]
+    low = np.where(swap[:, None], b, a)
+    high = np.where(swap[:, None], a, b)
+    t = (plane - low[:, 2]) / (high[:, 2] - low[:, 2])
+    return low[:, :2] + t[:, None] * (high[:, :2] - low[:, :2])
+
+def chain_segments(segments, tolerance=CONTOUR_TOLERANCE):
+    """Link (M, 2, 2) segments sharing endpoints into closed loops
+    
+    Endpoints are snapped to a grid of the given tolerance and grouped by cell
+    key, which turns chaining into a walk over a node-to-segment table that
+    visits each segment once. Returns a list of (K, 2) point arrays without a
+    repeated closing point, each following the direction of the majority of its
+    segments. Chains that do not close are dropped.
+    """
+    segments = np.asarray(segments, dtype=np.float64).reshape(-1, 2, 2)
+    segment_count = len(segments)
+    if segment_count == 0:
+        return []
+        
+    points = segments.reshape(-1, 2)
+    _, first, nodes = np.unique(grid_keys(points, tolerance), return_index=True, return_inverse=True)
+    nodes = nodes.ravel()
+    node_points = points[first]
+    
+    # Segments incident to every node as a CSR table over the endpoint slots
+    slots = np.argsort(nodes, kind='stable')
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(nodes))]).tolist()
+    slots = slots.tolist()
+    ends = nodes.reshape(-1, 2).tolist()
+    
+    visited = [False] * segment_count
+    loops = []
+    for start in range(segment_count):
+        if visited[start]:
+            continue
+        visited[start] = True
+        start_node, node = ends[start]
+        if start_node == node:
+            continue
+            
+        path = [start_node]
+        forward = 1
+        closed = False
+        while True:
+            if node == start_node:
+                closed = True
+                break
+            path.append(node)
+            
+            # Continue along any unvisited segment at this node
+            step = None
+            for slot in slots[offsets[node]:offsets[node + 1]]:
+                if not visited[slot >> 1]:
+                    step = slot
+                    break
+            if step is None:
+                break
+                
+            segment = step >> 1
+            visited[segment] = True
+            if step & 1:
+                # Entered the segment at its end point, walking it backwards
+                forward -= 1
+                node = ends[segment][0]
+            else:
+                forward += 1
+                node = ends[segment][1]
+                
+        if closed and len(path) >= 3:
+            loop = node_points[path]
+            loops.append(loop if forward >= 0 else loop[::-1])
+            
+    return loops
+
+def _signed_area(loop):
+    """Shoelace area of a closed loop, positive when counter-clockwise"""
+    x, y = loop[:, 0], loop[:, 1]
+    return 0.5 * (np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))
+
+def _point_in_loop(x, y, loop):
+    """Even-odd test of a point against a closed loop"""
+    x0, y0 = loop[:, 0], loop[:, 1]
+    x1, y1 = np.roll(x0, -1), np.roll(y0, -1)
+    crosses = (y0 > y) != (y1 > y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_cross = x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+    return np.count_nonzero(crosses & (x < x_cross)) % 2 == 1
+
+DEFAULT_SLICE_SETTINGS = {
+    'infill_density': 0.2,   # Fraction of the interior covered by infill
+    'extrusion_width': 0.4,  # Width of one extruded line in mm
+    'infill_pattern': 'lines',  # Name of a pattern in infill.INFILL_PATTERNS
+    'perimeter_count': DEFAULT_PERIMETER_COUNT,  # Wall shells inside every contour
+    'skin_layers': DEFAULT_SKIN_LAYERS,  # Solid layers at top and bottom surfaces
+    'adaptive_layers': False,  # Vary the layer height with the surface slope
+    'min_layer_height': DEFAULT_MIN_LAYER_HEIGHT,
+    'max_layer_height': DEFAULT_MAX_LAYER_HEIGHT
+}
+
+# Triangles of the mesh being sliced, attached once per pool worker
+_shared_memory = None
+_shared_triangles = None
+_shared_z_index = None
+
+def _attach_shared_triangles(name, shape, dtype):
+    """Pool initializer mapping the shared triangle array into the worker"""
+    global _shared_memory, _shared_triangles, _shared_z_index
+    # The parent owns and unlinks the segment. A worker attaching with the
+    # default tracking registers it too, so a tracker of its own warns about
+    # a leak and unlinks it again. Unregistering afterwards would drop the
+    # parent's entry from a shared tracker, so the worker never registers
+    if sys.version_info >= (3, 13):
+        _shared_memory = SharedMemory(name=name, track=False)
+    else:
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            _shared_memory = SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+    _shared_triangles = np.ndarray(shape, dtype=dtype, buffer=_shared_memory.buf)
+    z = _shared_triangles[:, :, 2]
+    _shared_z_index = TriangleZIndex(np.stack([z.min(axis=1), z.max(axis=1)], axis=1))
+
+def _slice_layer_range(first_index, heights, settings):
+    """Slice one range of layer heights in a pool worker"""
+    engine = SlicerEngine()
+    return list(engine._slice_heights(_shared_triangles, _shared_z_index, heights, settings, first_index))
 
 class SlicerEngine:
     def __init__(self):
         pass
         
-    def slice(self, mesh, layer_height, progress_callback=None):
+    def slice(self, mesh, layer_height, progress_callback=None, workers=None, settings=None):
         """Slice mesh into layers"""
-        bounds = mesh.bounds
-        min_z, max_z = bounds[0][2], bounds[1][2]
+        return list(self.iter_layers(mesh, layer_height, progress_callback, workers, settings))
+        
+    def iter_layers(self, mesh, layer_height, progress_callback=None, workers=None, settings=None):
+        """Yield the layers of the mesh bottom up as soon as each one is ready
+        
+        Only a batch of layers is held at a time, so memory stays bounded no
+        matter how tall the model is. With workers > 1 the layers are split into
+        ranges that are sliced by a process pool, the workers read the triangles
+        from shared memory.
+        
+        settings may override any of DEFAULT_SLICE_SETTINGS, e.g. the fraction
+        'infill_density' from the GUI. With 'adaptive_layers' the layer height
+        varies between 'min_layer_height' and 'max_layer_height' with the
+        slope of the surface instead of being layer_height everywhere.
+        """
+        settings = dict(DEFAULT_SLICE_SETTINGS, **(settings or {}))
         
         # Calculate layer positions
-        layer_count = int(math.ceil((max_z - min_z) / layer_height))
-        layers = []
+        if settings['adaptive_layers']:
+            heights, thicknesses = adaptive_layer_heights(mesh.face_normals, mesh.face_z_extent,
+                                                          settings['min_layer_height'], settings['max_layer_height'])
+        else:
+            bounds = mesh.bounds
+            heights, thicknesses = uniform_layer_heights(bounds[0][2], bounds[1][2], layer_height)
+        layer_count = len(heights)
         
-        for i in range(layer_count):
+        if workers and workers > 1 and layer_count > LAYER_BATCH_SIZE:
+            layers = self._iter_layers_parallel(mesh, heights, workers, settings)
+        else:
+            layers = self._slice_heights(mesh.triangles, TriangleZIndex(mesh.face_z_extent), heights, settings)
+        if settings['skin_layers'] > 0:
+            layers = self._iter_skins(layers, settings)
+            
+        for i, layer in enumerate(layers):
             if progress_callback:
                 progress_callback((i / layer_count) * 100)
-                
-            z = min_z + i * layer_height
-            layer = self._slice_at_z(mesh, z)
-            layers.append(layer)
+            layer.thickness = float(thicknesses[i])
+            yield layer
             
-        return layers
-        
-    def _slice_at_z(self, mesh, z):
-        """Create a layer by slicing the mesh at given Z height"""
-        intersections = []
-        
-        # Find all triangle intersections with the Z plane
-        for triangle in mesh.triangles:
-            intersection = self._triangle_plane_intersection(triangle, z)
-            if intersection is not None:
-                intersections.append(intersection)
-                
-        # Convert intersections to polygons
-        perimeters = self._lines_to_polygons(intersections)
+    def fill_layers(self, layers, progress_callback=None, settings=None):
+        """Return new layers with the contours of layers and shells and infill for settings
         
-        # Generate infill for each polygon
-        infill_lines = []
-        for polygon in perimeters:
-            infill = self._generate_infill(polygon, z)
-            infill_lines.extend(infill)
+        Used when only wall or infill settings changed: the contours are kept
+        and the mesh is not cut again.
+        """
+        settings = dict(DEFAULT_SLICE_SETTINGS, **(settings or {}))
+        filled = (self._fill_layer(i, layer.z_height, layer.perimeters, settings) for i, layer in enumerate(layers))
+        if settings['skin_layers'] > 0:
+            filled = self._iter_skins(filled, settings)
             
-        return Layer(z, perimeters, infill_lines)
+        result = []
+        for i, (layer, new_layer) in enumerate(zip(layers, filled)):
+            if progress_callback:
+                progress_callback((i / len(layers)) * 100)
+            new_layer.thickness = layer.thickness
+            result.append(new_layer)
+        return result
         
-    def _triangle_plane_intersection(self, triangle, z):
-        """Find intersection between triangle and horizontal plane at Z"""
-        v0, v1, v2 = triangle
+    def _iter_layers_parallel(self, mesh, heights, workers, settings):
+        """Slice layer ranges in a process pool sharing one copy of the triangles"""
+        triangles = mesh.triangles
+        shared_memory = SharedMemory(create=True, size=max(triangles.nbytes, 1))
         
-        # Check which vertices are above/below the plane
-        z_coords = [v0[2], v1[2], v2[2]]
-        vertices = [v0, v1, v2]
+        try:
+            shared = np.ndarray(triangles.shape, dtype=triangles.dtype, buffer=shared_memory.buf)
+            shared[...] = triangles
+            del shared
+            
+            # Several ranges per worker so uneven layers still balance out
+            chunk_size = max(LAYER_BATCH_SIZE, int(math.ceil(len(heights) / (workers * 4))))
+            chunks = [(i, heights[i:i + chunk_size]) for i in range(0, len(heights), chunk_size)]
+            
+            with ProcessPoolExecutor(max_workers=workers, initializer=_attach_shared_triangles,
+                                     initargs=(shared_memory.name, triangles.shape, triangles.dtype.str)) as pool:
+                # Keep a bounded number of ranges in flight and hand them out in
+                # submission order so the layers stay sorted by height
+                pending = deque()
+                for first_index, chunk in chunks:
+                    pending.append(pool.submit(_slice_layer_range, first_index, chunk, settings))
+                    if len(pending) >= 2 * workers:
+                        yield from pending.popleft().result()
+                while pending:
+                    yield from pending.popleft().result()
+        finally:
+            shared_memory.close()
+            shared_memory.unlink()
+            
+    def _slice_heights(self, triangles, z_index, heights, settings, first_index=0):
+        """Yield the layers at ascending heights, cutting them in batches
         
-        # Find intersections with plane
-        intersections = []
+        first_index is the layer number of heights[0], patterns may change
+        from layer to layer.
+        """
+        batches = [heights[i:i + LAYER_BATCH_SIZE] for i in range(0, len(heights), LAYER_BATCH_SIZE)]
         
-        for i in range(3):
-            j = (i + 1) % 3
-            z1, z2 = z_coords[i], z_coords[j]
+        layer_index = first_index
+        for batch, active in zip(batches, z_index.sweep((b[0], b[-1]) for b in batches)):
+            segments, layer_ids = slice_triangles(triangles[active], batch)
             
-            # Check if edge crosses the plane
-            if (z1 <= z <= z2) or (z2 <= z <= z1):
-                if abs(z1 - z2) > 1e-10:  # Avoid division by zero
-                    t = (z - z1) / (z2 - z1)
-                    intersection = [
-                        vertices[i][0] + t * (vertices[j][0] - vertices[i][0]),
-                        vertices[i][1] + t * (vertices[j][1] - vertices[i][1]),
-                        z
-                    ]
-                    intersections.append(intersection[:2])  # Only X, Y coordinates
-                    
-        # Remove duplicates and return line segment if we have exactly 2 points
-        unique_intersections = []
-        for point in intersections:
-            is_duplicate = False
-            for existing in unique_intersections:
-                if abs(point[0] - existing[0]) < 1e-6 and abs(point[1] - existing[1]) < 1e-6:
-                    is_duplicate = True
-                    break
-            if not is_duplicate:
-                unique_intersections.append(point)
+            # Group the segments by layer
+            order = np.argsort(layer_ids, kind='stable')
+            splits = np.searchsorted(layer_ids[order], np.arange(len(batch) + 1))
+            
+            for j, z in enumerate(batch):
+                layer_segments = segments[order[splits[j]:splits[j + 1]]]
+                yield self._build_layer(layer_index, float(z), layer_segments, settings)
+                layer_index += 1
                 
-        if len(unique_intersections) == 2:
-            return unique_intersections
-        return None
+    def _build_layer(self, layer_index, z, segments, settings):
+        """Create a layer from the cut segments at Z height"""
+        # Convert intersections to polygons
+        perimeters = self._lines_to_polygons(segments)
         
-    def _lines_to_polygons(self, lines):
-        """Convert line segments to closed polygons"""
-        if not lines:
-            return []
+        return self._fill_layer(layer_index, z, perimeters, settings)
+        
+    def _fill_layer(self, layer_index, z, perimeters, settings):
+        """Create a layer with wall shells inside the contours and infill inside the walls
+        
+        With skin layers the infill waits for _iter_skins, which needs the
+        layers above.
+        """
+        shells, infill_region = generate_shells(perimeters, settings['perimeter_count'], settings['extrusion_width'])
+        
+        # Generate infill for all polygons of the layer at once
+        infill_lines = None
+        if settings['skin_layers'] <= 0:
+            infill_lines = self._generate_infill(infill_region, layer_index, z, settings)
             
-        polygons = []
+        return Layer(z, perimeters, infill_lines, shells=shells, infill_region=infill_region)
         
-        # For simple shapes like cubes, we can build polygons by connecting line segments
-        if len(lines) >= 3:
-            try:
-                # First, try the shapely polygonize function
-                line_strings = [LineString(line) for line in lines if len(line) >= 2]
-                if line_strings:
-                    result = list(polygonize(line_strings))
-                    polygons.extend([p for p in result if p.is_valid and not p.is_empty])
-                    
-                # If polygonize didn't work, try a simpler approach
-                if not polygons:
-                    # Collect all points and try to form a polygon
-                    all_points = []
-                    for line in lines:
-                        all_points.extend(line)
-                    
-                    if len(all_points) >= 6:  # At least 3 points (x,y pairs)
-                        # Remove duplicates while preserving order
-                        unique_points = []
-                        for point in all_points:
-                            is_duplicate = False
-                            for existing in unique_points:
-                                if abs(point[0] - existing[0]) < 1e-6 and abs(point[1] - existing[1]) < 1e-6:
-                                    is_duplicate = True
-                                    break
-                            if not is_duplicate:
-                                unique_points.append(point)
-                        
-                        if len(unique_points) >= 3:
-                            # Sort points to form a proper polygon (convex hull approach)
-                            center_x = sum(p[0] for p in unique_points) / len(unique_points)
-                            center_y = sum(p[1] for p in unique_points) / len(unique_points)
-                            
-                            def angle_from_center(point):
-                                return math.atan2(point[1] - center_y, point[0] - center_x)
-                            
-                            sorted_points = sorted(unique_points, key=angle_from_center)
-                            
-                            try:
-                                polygon = Polygon(sorted_points)
-                                if polygon.is_valid and not polygon.is_empty:
-                                    polygons.append(polygon)
-                            except:
-                                pass
-                                
-            except Exception as e:
-                print(f"Error in _lines_to_polygons: {e}")
-                pass
-                
-        return polygons
+    def _iter_skins(self, layers, settings):
+        """Fill the layers, solid near top and bottom surfaces and sparse elsewhere"""
+        solid_spacing = line_spacing(1.0, settings['extrusion_width'])
+        for layer_index, (layer, solid, sparse) in enumerate(iter_skin_regions(layers, settings['skin_layers'],
+                                                                               settings['extrusion_width'])):
+            layer.infill_lines = self._generate_infill(sparse, layer_index, layer.z_height, settings)
+            layer.skin_lines = generate_infill(solid, SKIN_PATTERN, solid_spacing, layer_index, layer.z_height)
+            yield layer
+            
+    def _lines_to_polygons(self, segments):
+        """Convert cut segments to polygons with holes
         
-    def _generate_infill(self, polygon, z, density=0.2, line_spacing=2.0):
-        """Generate infill lines for a polygon"""
-        if not polygon.is_valid or polygon.is_empty:
+        Segments are linked into closed loops, then loops wound against the
+        outermost one become holes of the smallest loop around them.
+        """
+        loops = [loop for loop in chain_segments(segments) if len(loop) >= 3]
+        if not loops:
             return []
             
-        infill_lines = []
-        bounds = polygon.bounds
-        min_x, min_y, max_x, max_y = bounds
+        areas = np.array([_signed_area(loop) for loop in loops])
+        order = np.argsort(-np.abs(areas), kind='stable')
         
-        # Generate horizontal infill lines
-        y = min_y
-        line_direction = 1  # Alternate direction for better print quality
+        # Meshes wound inside out flip every loop, so take the sign of the largest
+        outer_sign = np.sign(areas[order[0]]) or 1.0
         
-        while y <= max_y:
-            if line_direction > 0:
-                line = LineString([(min_x - 1, y), (max_x + 1, y)])
-            else:
-                line = LineString([(max_x + 1, y), (min_x - 1, y)])
+        shells = []
+        holes = []
+        for i in order:
+            if areas[i] == 0:
+                continue
+            if np.sign(areas[i]) == outer_sign:
+                shells.append(i)
+                continue
                 
-            try:
-                intersection = polygon.intersection(line)
-                
-                if intersection.geom_type == 'LineString':
-                    coords = list(intersection.coords)
-                    if len(coords) >= 2:
-                        infill_lines.append(coords)
-                elif intersection.geom_type == 'MultiLineString':
-                    for line_seg in intersection.geoms:
-                        coords = list(line_seg.coords)
-                        if len(coords) >= 2:
-                            infill_lines.append(coords)
-            except:
-                pass
+            # The smallest shell around a hole is the last one containing it
+            x, y = loops[i][0]
+            parent = None
+            for j in reversed(shells):
+                if _point_in_loop(x, y, loops[j]):
+                    parent = j
+                    break
+                    
+            if parent is None:
+                # Stray loop from a badly wound mesh, keep it as a shell
+                shells.append(i)
+            else:
+                holes.append((parent, i))
                 
-            y += line_spacing
-            line_direction *= -1
+        shell_holes = {i: [] for i in shells}
+        for parent, i in holes:
+            shell_holes[parent].append(loops[i])
             
-        return infill_lines
-
-
+        polygons = []
+        for i in shells:
+            polygon = orient(Polygon(loops[i], shell_holes[i]), sign=1.0)
+            if not polygon.is_valid:
+                # Self intersecting cut of a broken mesh
+                polygon = polygon.buffer(0)
+            if polygon.is_empty:
+                continue
+            if polygon.geom_type == 'MultiPolygon':
+                polygons.extend(orient(p, sign=1.0) for p in polygon.geoms)
+            else:
+                polygons.append(orient(polygon, sign=1.0))
+                
+        return polygons
+        
+    def _generate_infill(self, polygons, layer_index, z, settings):
+        """Generate infill lines for the polygons of a layer"""
+        spacing = line_spacing(settings['infill_density'], settings['extrusion_width'])
+        return generate_infill(polygons, settings['infill_pattern'], spacing, layer_index, z)
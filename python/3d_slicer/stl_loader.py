@@ -1,96 +1,118 @@
 import numpy as np
+import os
+import re
 import struct
+from mesh import Mesh
 
-class Mesh:
-    def __init__(self, triangles):
-        self.triangles = np.array(triangles)
-        self._bounds = None
-        self._volume = None
-        
-    @property
-    def bounds(self):
-        if self._bounds is None:
-            vertices = self.triangles.reshape(-1, 3)
-            self._bounds = np.array([vertices.min(axis=0), vertices.max(axis=0)])
-        return self._bounds
-        
-    @property
-    def volume(self):
-        if self._volume is None:
-            # Calculate volume using divergence theorem
-            volume = 0.0
-            for triangle in self.triangles:
-                v0, v1, v2 = triangle
-                volume += np.dot(v0, np.cross(v1, v2))
-            self._volume = abs(volume) / 6.0
-        return self._volume
+# Binary STL record: normal, three vertices and the attribute byte count (50 bytes)
+BINARY_RECORD_DTYPE = np.dtype([
+    ('normal', '<f4', (3,)),
+    ('vertices', '<f4', (3, 3)),
+    ('attribute', '<u2')
+])
+BINARY_HEADER_SIZE = 84
+
+ASCII_BLOCK_SIZE = 16 * 1024 * 1024
+ASCII_VERTEX_PATTERN = re.compile(rb'\n[ \t]*vertex[ \t]([^\n]*)')
 
 class STLLoader:
     def __init__(self):
         pass
         
-    def load(self, file_path):
-        """Load STL file and return Mesh object"""
+    def load(self, file_path, mmap=False):
+        """Load STL file and return Mesh object
+        
+        With mmap=True binary files are memory mapped instead of read into RAM,
+        the triangles of the returned mesh are then a read-only view of the file.
+        """
         with open(file_path, 'rb') as f:
-            # Check if binary or ASCII
-            header = f.read(80)
-            f.seek(0)
+            if self._detect_format(f, os.fstat(f.fileno()).st_size) == 'ascii':
+                return self._load_ascii(f)
+            return self._load_binary(f, mmap=mmap)
             
-            # Try to detect ASCII format
-            try:
-                content = f.read(1024).decode('ascii').lower()
-                if 'solid' in content and 'facet' in content:
-                    f.seek(0)
-                    return self._load_ascii(f)
-            except:
-                pass
+    def _detect_format(self, f, file_size):
+        """Return 'binary' or 'ascii' from the 84-byte header and the file size"""
+        header = f.read(BINARY_HEADER_SIZE)
+        f.seek(0)
+        
+        # A binary file's size is fully determined by its triangle count. This is
+        # checked first since many exporters start binary headers with "solid" too
+        if len(header) == BINARY_HEADER_SIZE:
+            triangle_count = struct.unpack('<I', header[80:84])[0]
+            if file_size == BINARY_HEADER_SIZE + triangle_count * BINARY_RECORD_DTYPE.itemsize:
+                return 'binary'
                 
-            # Load as binary
-            f.seek(0)
-            return self._load_binary(f)
-            
-    def _load_binary(self, f):
-        """Load binary STL file"""
+        if header.lstrip().lower().startswith(b'solid'):
+            return 'ascii'
+        return 'binary'
+        
+    def _load_binary(self, f, mmap=False):
+        """Load binary STL file
+        
+        All triangle records are read (or mapped) at once as a structured array,
+        the (N, 3, 3) vertex block handed to Mesh is a view into it.
+        """
         # Skip header
-        f.read(80)
+        f.seek(80)
         
         # Read number of triangles
         triangle_count = struct.unpack('<I', f.read(4))[0]
         
-        triangles = []
-        for _ in range(triangle_count):
-            # Read normal vector (skip it for now)
-            f.read(12)
-            
-            # Read vertices
-            triangle = []
-            for _ in range(3):
-                vertex = struct.unpack('<fff', f.read(12))
-                triangle.append(vertex)
-            
-            triangles.append(triangle)
-            
-            # Skip attribute byte count
-            f.read(2)
-            
-        return Mesh(triangles)
+        if mmap:
+            records = np.memmap(f, dtype=BINARY_RECORD_DTYPE, mode='r',
+                                offset=BINARY_HEADER_SIZE, shape=(triangle_count,))
+        else:
+            records = np.empty(triangle_count, dtype=BINARY_RECORD_DTYPE)
+            bytes_read = f.readinto(records) or 0
+            if bytes_read != records.nbytes:
+                raise ValueError("Truncated binary STL: expected {} triangles, found {}".format(
+                    triangle_count, bytes_read // BINARY_RECORD_DTYPE.itemsize))
+                    
+        return Mesh(records['vertices'])
         
-    def _load_ascii(self, f):
-        """Load ASCII STL file"""
-        triangles = []
-        current_triangle = []
+    def _load_ascii(self, f, block_size=ASCII_BLOCK_SIZE):
+        """Load ASCII STL file
         
-        for line in f:
-            line = line.decode('ascii').strip().lower()
-            
-            if line.startswith('vertex'):
-                coords = line.split()[1:4]
-                vertex = [float(x) for x in coords]
-                current_triangle.append(vertex)
+        The file is read in large blocks and all vertex coordinates of a block
+        are extracted and converted in bulk into a preallocated array, which
+        grows by doubling when it fills up.
+        """
+        coords = np.empty(3 * 1024, dtype=np.float64)
+        count = 0
+        remainder = b''
+        
+        while True:
+            data = f.read(block_size)
+            block = remainder + data
+            if data:
+                # Keep the trailing partial line for the next block
+                split = block.rfind(b'\n') + 1
+                block, remainder = block[:split], block[split:]
+                
+            if block:
+                values = self._parse_ascii_vertices(block)
+                if count + len(values) > len(coords):
+                    grown = np.empty(max(2 * len(coords), count + len(values)), dtype=np.float64)
+                    grown[:count] = coords[:count]
+                    coords = grown
+                coords[count:count + len(values)] = values
+                count += len(values)
                 
-            elif line.startswith('endfacet'):
-                if len(current_triangle) == 3:
-                    triangles.append(current_triangle)
-                current_triangle = []
+            if not data:
+                break
                 
-        return Mesh(triangles)
\ No newline at end of file
+        # Every facet has exactly three vertices, drop an incomplete trailing one
+        triangle_count = count // 9
+        return Mesh(coords[:triangle_count * 9].reshape(triangle_count, 3, 3))
+        
+    def _parse_ascii_vertices(self, block):
+        """Return the flat vertex coordinates found in a block of complete lines"""
+        # The pattern anchors on the preceding newline, so one is prepended
+        vertex_lines = ASCII_VERTEX_PATTERN.findall(b'\n' + block.lower())
+        if not vertex_lines:
+            return np.empty(0, dtype=np.float64)
+            
+        values = np.fromstring(b' '.join(vertex_lines).decode('ascii'), dtype=np.float64, sep=' ')
+        if len(values) != 3 * len(vertex_lines):
+            raise ValueError("Malformed vertex line in ASCII STL")
+        return values
@@ -0,0 +1,66 @@
+import io
+import os
+import tempfile
+import numpy as np
+from mesh import Mesh
+from slicer_engine import SlicerEngine
+from gcode_generator import GCodeGenerator
+from pipeline import DEFAULT_SETTINGS
+
+def box_mesh(size=(20.0, 20.0, 4.0)):
+    """Closed box with outward facing triangles"""
+    corners = np.array([[x, y, z] for x in (0, size[0]) for y in (0, size[1]) for z in (0, size[2])])
+    faces = np.array([(0, 2, 6), (0, 6, 4), (1, 5, 7), (1, 7, 3), (0, 4, 5), (0, 5, 1),
+                      (2, 3, 7), (2, 7, 6), (0, 1, 3), (0, 3, 2), (4, 6, 7), (4, 7, 5)])
+    return Mesh.from_indexed(corners, faces)
+
+def box_layers():
+    return SlicerEngine().slice(box_mesh(), DEFAULT_SETTINGS['layer_height'], settings=DEFAULT_SETTINGS)
+
+def test_generate_to_text_streams():
+    layers = box_layers()
+    expected = GCodeGenerator().generate(layers, DEFAULT_SETTINGS)
+    
+    stream = io.StringIO()
+    GCodeGenerator().generate_to(stream, layers, DEFAULT_SETTINGS)
+    assert stream.getvalue() == expected
+    
+    # NamedTemporaryFile wraps the file object and is no io.TextIOBase
+    with tempfile.NamedTemporaryFile('w', suffix='.gcode', delete=False, encoding='utf-8') as f:
+        path = f.name
+        counters = GCodeGenerator().generate_to(f, layers, DEFAULT_SETTINGS)
+    try:
+        with open(path, encoding='utf-8') as f:
+            assert f.read() == expected
+        assert counters['bytes'] == len(expected.encode('utf-8'))
+    finally:
+        os.remove(path)
+
+def test_generate_to_binary_stream():
+    layers = box_layers()
+    stream = io.BytesIO()
+    GCodeGenerator().generate_to(stream, layers, DEFAULT_SETTINGS)
+    assert stream.getvalue().decode('utf-8') == GCodeGenerator().generate(layers, DEFAULT_SETTINGS)
+
+def test_polylines_extrude_from_their_own_start():
+    # The travel to the second line is long, only the two 10 mm lines extrude
+    paths = [np.array([[0.0, 0.0], [10.0, 0.0]]), np.array([[50.0, 50.0], [50.0, 60.0]])]
+    block = GCodeGenerator()._print_paths(paths, 0.1, 'infill', extruder_start=1.0)
+    assert np.allclose(block.extruder, [1.0, 2.0, 2.0, 3.0])
+
+def total_extrusion(settings):
+    settings = dict(DEFAULT_SETTINGS, skin_layers=0, **settings)
+    layers = SlicerEngine().slice(box_mesh(), settings['layer_height'], settings=settings)
+    generator = GCodeGenerator()
+    generator.generate(layers, settings)
+    return generator.extruder_position, layers
+
+def test_adaptive_layers_extrude_like_uniform_layers():
+    # The flat top and bottom give thin adaptive layers, the walls thick ones
+    uniform, _ = total_extrusion({'layer_height': 0.3})
+    for layer_height in (0.2, 2.0):
+        adaptive, layers = total_extrusion({'layer_height': layer_height, 'adaptive_layers': True,
+                                            'min_layer_height': 0.1, 'max_layer_height': 0.3})
+        assert min(layer.thickness for layer in layers) < 0.3
+        assert layers[-1].z_height < 4.0 - 0.05
+        assert abs(adaptive - uniform) < 0.05 * uniform
@@ -0,0 +1,30 @@
+import math
+import numpy as np
+import shapely
+from infill import GyroidPattern, generate_infill, line_spacing
+
+def test_gyroid_curves_lie_on_the_surface():
+    pattern = GyroidPattern()
+    spacing = 2.0
+    scale = math.pi / spacing
+    branches = set()
+    for phase_index in range(pattern.phases):
+        # Z of every phase, both the solve for y and the solve for x layers
+        z = phase_index * 2 * math.pi / pattern.phases / scale
+        phase = pattern._phase(spacing, z)
+        branches.add(abs(math.cos(phase)) >= abs(math.sin(phase)))
+        for curve in pattern.tile(spacing, (-10.0, -10.0, 10.0, 10.0), z):
+            x, y = curve[:, 0] * scale, curve[:, 1] * scale
+            residual = np.sin(x) * np.cos(y) + np.sin(y) * math.cos(phase) + math.sin(phase) * np.cos(x)
+            assert np.abs(residual).max() < 1e-9
+    assert branches == {True, False}
+
+def test_honeycomb_prints_every_wall_once():
+    spacing = line_spacing(0.2, 0.4)
+    lines = [shapely.linestrings(line) for line in generate_infill([shapely.box(0, 0, 40, 40)], 'honeycomb',
+                                                                    spacing, 0, 0.2)]
+    printed = sum(shapely.length(lines))
+    assert abs(printed - shapely.length(shapely.union_all(lines))) < 1e-6 * printed
+    
+    # Same printed length per area as straight lines at the spacing
+    assert abs(printed - 40 * 40 / spacing) < 0.05 * printed
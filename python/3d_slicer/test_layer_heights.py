@@ -0,0 +1,10 @@
+import numpy as np
+from layer_heights import adaptive_layer_heights
+
+def test_adaptive_layers_end_below_the_top():
+    # Stacking these heights lands within rounding error of z_max
+    normals = np.array([[1.0, 0.0, 0.0]])
+    for z_min, z_max in ((-10.0, 20.0), (0.1, 1.1), (-10.0, 10.0)):
+        starts, thicknesses = adaptive_layer_heights(normals, np.array([[z_min, z_max]]), 0.05, 0.2)
+        assert z_max - starts[-1] > 1e-6
+        assert starts[-1] + thicknesses[-1] >= z_max - 1e-9
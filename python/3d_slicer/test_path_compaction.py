@@ -0,0 +1,31 @@
+import math
+import numpy as np
+from path_compaction import ARC_MIN_POINTS, _fit_arc_batch, compact_paths, fit_arcs
+
+def test_rings_become_arcs_and_zigzags_do_not():
+    angles = np.linspace(0, 2 * math.pi, 257)
+    ring = np.stack([15 * np.cos(angles), 15 * np.sin(angles)], axis=1)
+    zigzag = np.stack([np.arange(20.0), np.tile([0.0, 1.0], 10)], axis=1)
+    paths, arcs = compact_paths([ring, zigzag, [(0.0, 0.0), (5.0, 0.0)]])
+    assert len(paths[0]) <= 4 and arcs[0][:, 2].any()
+    assert len(paths[1]) == len(zigzag) and not arcs[1][:, 2].any()
+    assert not arcs[2][:, 2].any()
+
+def test_arc_spans_fit_and_stay_inside_their_path():
+    rng = np.random.default_rng(0)
+    t = np.linspace(0, 12, 150)
+    paths = [np.stack([t, 3 * np.sin(t)], axis=1),
+             np.round(np.stack([10 * np.cos(t / 3), 10 * np.sin(t / 3)], axis=1), 4),
+             np.cumsum(rng.normal(size=(80, 2)), axis=0)]
+    points = np.concatenate(paths)
+    counts = np.array([len(path) for path in paths])
+    path_lasts = np.repeat(np.cumsum(counts) - 1, counts)
+    
+    previous_end = 0
+    spans = fit_arcs(points, 0.01, path_lasts)
+    assert spans
+    for start, end, center, direction in spans:
+        assert start >= previous_end and end <= path_lasts[start] and end - start + 1 >= ARC_MIN_POINTS
+        centers, directions, fits = _fit_arc_batch(points[None, start:end + 1], 0.01)
+        assert fits[0] and np.allclose(centers[0], center) and directions[0] == direction
+        previous_end = end
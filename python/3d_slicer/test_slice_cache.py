@@ -0,0 +1,20 @@
+import os
+from slice_cache import SliceCache
+from test_gcode_generator import box_layers
+
+def test_damaged_entries_are_misses_and_removed(tmp_path):
+    cache = SliceCache(str(tmp_path))
+    layers = box_layers()
+    cache.put('box', layers)
+    path = cache.path('box')
+    with open(path, 'rb') as f:
+        data = f.read()
+    assert len(cache.get('box')) == len(layers)
+    
+    # Zero bytes, a cut off header and an entry cut off halfway
+    for size in (0, 10, len(data) // 2):
+        with open(path, 'wb') as f:
+            f.write(data[:size])
+        assert cache.get('box') is None
+        assert not os.path.exists(path)
+    assert cache.get('missing') is None